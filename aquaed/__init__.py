@@ -0,0 +1 @@
+"""Shared AquaED logic used by the Streamlit app and the headless API."""
@@ -0,0 +1,192 @@
+"""Admin view, shown instead of the app when the page is opened with
+``?admin=<AQUAED_ADMIN_TOKEN>``."""
+import hmac
+import time
+
+import streamlit as st
+
+from aquaed import memprof, resilience, sessions, shared_cache, timeseries, water_data
+from aquaed.core import get_secret
+
+
+def is_admin_request():
+    token = get_secret("AQUAED_ADMIN_TOKEN", default=None)
+    supplied = st.query_params.get("admin")
+    return bool(token and supplied and hmac.compare_digest(str(token), str(supplied)))
+
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def render_sessions():
+    st.subheader("🧮 Sessions")
+    stats = sessions.session_stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Tracked sessions", len(stats))
+    col2.metric("Session state", format_bytes(sum(s["state_bytes"] for s in stats)))
+    col3.metric("Session artifacts on disk", format_bytes(sum(s["disk_bytes"] for s in stats)))
+
+    if st.button("🧹 Sweep idle and ended sessions now"):
+        removed = sessions.sweep()
+        st.success(f"Reclaimed {len(removed)} session(s).")
+
+    largest = sessions.largest_sessions(20)
+    if largest:
+        st.dataframe([
+            {
+                "Session": s["session_id"][:8],
+                "Reruns": s["reruns"],
+                "Idle (s)": s["idle_s"],
+                "State": format_bytes(s["state_bytes"]),
+                "Artifacts": s["artifacts"],
+                "Disk": format_bytes(s["disk_bytes"]),
+                "Largest keys": ", ".join(f"{key} ({format_bytes(size)})" for key, size in s["largest_keys"]),
+            }
+            for s in largest
+        ], width="stretch")
+    else:
+        st.write("No sessions tracked yet.")
+
+
+def render_upstream():
+    st.subheader("📡 OpenAI health")
+    st.write(f"Circuit breaker: **{resilience.breaker.state}**")
+    stats = resilience.latencies.stats()
+    if stats:
+        st.dataframe([
+            {
+                "Model": model,
+                "Samples": s["samples"],
+                "p50 (s)": s["p50"],
+                "p95 (s)": s["p95"],
+                "Hedge after (s)": round(resilience.latencies.hedge_after(model), 2),
+            }
+            for model, s in stats.items()
+        ], width="stretch")
+
+
+def render_routing():
+    from aquaed.routing import get_router
+    st.subheader("🧭 Model routing")
+    router = get_router()
+    sites = sorted(router.sites)
+    st.write(", ".join(f"{site} → **{router.choose(site)}**" for site in sites))
+    st.dataframe(router.stats(), width="stretch")
+
+
+def render_shared_cache():
+    st.subheader("🗄️ Shared cache")
+    stats = shared_cache.stats()
+    st.write(f"Backend: **{stats['backend']}**, errors: {stats['errors']}")
+    if stats["last_error"]:
+        st.caption(f"Last error: {stats['last_error']}")
+    if stats["namespaces"]:
+        st.dataframe([
+            {
+                "Namespace": namespace,
+                "Entries": s["entries"],
+                "Size": format_bytes(s["bytes"]) if s["bytes"] is not None else "—",
+                "TTL (h)": shared_cache.limits(namespace)["ttl"] / 3600,
+            }
+            for namespace, s in sorted(stats["namespaces"].items())
+        ], width="stretch")
+
+
+def render_data():
+    st.subheader("💧 Water data")
+    status = water_data.status()
+    st.write(
+        f"Version **{status['version']}**: {status['rows']} rows, {status['zip_codes']} ZIP codes, "
+        f"loaded {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(status['loaded_at']))}"
+        + ("" if status["watching"] else " (file watcher off)")
+    )
+    if st.button("🔄 Reload water data now"):
+        changes = water_data.refresh(force=True)
+        st.success(changes.summary() if changes is not None else "No new valid version found.")
+        status = water_data.status()
+    if status["history"]:
+        st.dataframe([
+            {
+                "At": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(event["at"])),
+                "Version": event["version"],
+                "Status": event["status"],
+                "Detail": event["detail"],
+            }
+            for event in status["history"]
+        ], width="stretch")
+
+
+def render_timeseries():
+    st.subheader("📈 Sampling history")
+    status = timeseries.status()
+    if not status["available"]:
+        st.caption(f"No time-series store at {status['root']}. Load one with python -m aquaed.timeseries ingest samples.csv.")
+        return
+    st.write(
+        f"{status['zip_codes']} ZIP codes in {status['counties']} counties, "
+        f"{status['partition_files']} partition files ({format_bytes(status['bytes'])}); "
+        f"{status['cached_partitions']} partitions cached in this process"
+    )
+
+
+def render_memory():
+    st.subheader("🧠 Memory profile")
+    if not memprof.ENABLED:
+        st.caption("Set AQUAED_MEMPROFILE=1 and restart to trace allocations per rerun and session.")
+        return
+    samples = memprof.samples()
+    if samples:
+        latest, first = samples[-1], samples[0]
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("RSS", format_bytes(latest["rss"]), format_bytes(latest["rss"] - first["rss"]))
+        col2.metric("Traced", format_bytes(latest["traced"]), format_bytes(latest["traced"] - first["traced"]))
+        col3.metric("Open files", latest["open_files"], latest["open_files"] - first["open_files"])
+        col4.metric("Session artifacts", format_bytes(latest["artifact_bytes"]), format_bytes(latest["artifact_bytes"] - first["artifact_bytes"]))
+        st.line_chart(
+            {
+                "RSS (MB)": [s["rss"] / 2**20 for s in samples],
+                "Traced (MB)": [s["traced"] / 2**20 for s in samples],
+                "Session artifacts (MB)": [s["artifact_bytes"] / 2**20 for s in samples],
+            }
+        )
+        st.caption("Open files: " + ", ".join(f"{kind} {n}" for kind, n in sorted(latest["open_files_by_kind"].items())))
+
+    app_only = st.toggle("Attribute to app code (main_page.py, aquaed/)", value=True)
+    sites = memprof.top_sites(app_only=app_only)
+    if sites:
+        st.dataframe([{**site, "growth": format_bytes(site["growth_bytes"])} for site in sites], width="stretch")
+    else:
+        st.write("Need at least two reruns to compare.")
+
+    growth = memprof.session_growth()
+    if growth:
+        st.dataframe([
+            {
+                "Session": g["session_id"][:8],
+                "Reruns": g["reruns"],
+                "Growth": format_bytes(g["growth_bytes"]),
+                "Top sites": ", ".join(f"{site} ({format_bytes(size)})" for site, size in g["top_sites"]),
+            }
+            for g in growth
+        ], width="stretch")
+
+    col1, col2 = st.columns(2)
+    if col1.button("🔍 Count live clients and DataFrames"):
+        st.json(memprof.live_objects())
+    if col2.button("💾 Write memory dump"):
+        st.success(f"Wrote {memprof.dump()}")
+
+
+def render_admin():
+    st.header("🛠️ AquaED Admin")
+    render_sessions()
+    render_upstream()
+    render_routing()
+    render_shared_cache()
+    render_data()
+    render_timeseries()
+    render_memory()
@@ -0,0 +1,173 @@
+"""Per-city rollups of ``bayareawater.csv``.
+
+The rollups are stored in ``core.DATA_DIR`` as one file per source version,
+``city_aggregates-<sha256 prefix>.csv``, so a table can't be paired with
+another version's hash. They follow the snapshot in ``aquaed.water_data``: a
+hot reload recomputes just the affected cities. Rebuild by hand with
+``python -m aquaed.aggregates``.
+"""
+import glob
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from collections import Counter
+
+from aquaed import core, water_data
+from aquaed.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+TOP_CONTAMINANTS = 5
+# Versions kept on disk; older tables are removed when a new one is written
+KEEP_VERSIONS = 3
+
+_lock = threading.Lock()
+_loaded = {}
+
+
+def compute(df):
+    rows = []
+    for city, group in df.groupby("City", sort=True):
+        counts = Counter(c for value in group["Common Contaminants"] for c in core.split_contaminants(value))
+        rows.append({
+            "City": city,
+            "ZIP Count": len(group),
+            "Mean Score": round(float(group["Water Quality Score"].mean()), 1),
+            "Min Score": int(group["Water Quality Score"].min()),
+            "Max Score": int(group["Water Quality Score"].max()),
+            "EPA Share": round(float((group["Meets EPA Standards"] == "Yes").mean()), 3),
+            # Share of the city's ZIP rows that list each contaminant
+            "Top Contaminants": json.dumps({
+                name: round(count / len(group), 3) for name, count in counts.most_common(TOP_CONTAMINANTS)
+            }),
+        })
+    return pd.DataFrame(rows)
+
+
+def aggregates_path(source_hash):
+    return os.path.join(core.DATA_DIR, f"city_aggregates-{source_hash[:16]}.csv")
+
+
+def write(aggregates, source_hash):
+    # A unique temp name per writer, renamed into place, so concurrent
+    # processes never collide and readers never see a partial table
+    path = aggregates_path(source_hash)
+    fd, tmp = tempfile.mkstemp(dir=core.data_dir(), prefix=".city_aggregates-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", newline="") as f:
+            aggregates.to_csv(f, index=False)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    prune()
+    return path
+
+
+def prune(keep=KEEP_VERSIONS):
+    paths = sorted(glob.glob(os.path.join(core.DATA_DIR, "city_aggregates-*.csv")), key=os.path.getmtime, reverse=True)
+    for path in paths[keep:]:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def read(source_hash):
+    """The stored table for ``source_hash``, or None."""
+    try:
+        return pd.read_csv(aggregates_path(source_hash))
+    except OSError:
+        return None
+
+
+def rebuild():
+    # Hash and parse the same bytes so the file name always matches the table
+    with open(core.WATER_DATA_PATH, "rb") as f:
+        data = f.read()
+    source_hash = hashlib.sha256(data).hexdigest()
+    aggregates = compute(pd.read_csv(io.BytesIO(data)))
+    try:
+        write(aggregates, source_hash)
+    except OSError:
+        pass  # Read-only deployments keep the rollups in memory only
+    return aggregates
+
+
+def load():
+    """Return the rollup table for the current water data snapshot."""
+    snapshot = water_data.current()
+    with _lock:
+        if _loaded.get("version") == snapshot.version:
+            return _loaded["table"]
+        table = read(snapshot.version)
+        if table is None:
+            table = compute(snapshot.df)
+            try:
+                write(table, snapshot.version)
+            except OSError:
+                pass
+        _loaded.update(version=snapshot.version, table=table.set_index("City", drop=False))
+        return _loaded["table"]
+
+
+def update(old, new, cities):
+    """Bring a table loaded for snapshot ``old`` up to ``new`` by recomputing
+    only ``cities``. Any other table is left for ``load`` to rebuild."""
+    with _lock:
+        if _loaded.get("version") != old.version:
+            return
+        kept = _loaded["table"][~_loaded["table"]["City"].isin(cities)]
+        fresh = compute(new.df[new.df["City"].isin(cities)])
+        table = pd.concat([kept, fresh]).sort_values("City").reset_index(drop=True)
+        try:
+            write(table, new.version)
+        except OSError:
+            pass
+        _loaded.update(version=new.version, table=table.set_index("City", drop=False))
+
+
+def city_facts(city):
+    table = load()
+    if city not in table.index:
+        return None
+    row = table.loc[city]
+    return {
+        "city": city,
+        "zip_count": int(row["ZIP Count"]),
+        "mean_score": float(row["Mean Score"]),
+        "min_score": int(row["Min Score"]),
+        "max_score": int(row["Max Score"]),
+        "epa_share": float(row["EPA Share"]),
+        "top_contaminants": json.loads(row["Top Contaminants"]),
+    }
+
+
+def describe_city(facts):
+    contaminants = ", ".join(facts["top_contaminants"]) or "none reported"
+    return (
+        f"Across {facts['zip_count']} ZIP codes in {facts['city']}, water quality scores average {facts['mean_score']:.0f} "
+        f"(range {facts['min_score']}–{facts['max_score']}) and {facts['epa_share']:.0%} meet EPA standards. "
+        f"Most common contaminants: {contaminants}."
+    )
+
+
+def prompt_facts(facts):
+    """Compact facts for grounding an LLM prompt."""
+    contaminants = "; ".join(f"{name} in {share:.0%} of ZIPs" for name, share in facts["top_contaminants"].items())
+    return (
+        f"City: {facts['city']}. ZIPs: {facts['zip_count']}. Score mean {facts['mean_score']:.0f}, "
+        f"min {facts['min_score']}, max {facts['max_score']}. Meets EPA: {facts['epa_share']:.0%} of ZIPs. "
+        f"Contaminants: {contaminants}."
+    )
+
+
+if __name__ == "__main__":
+    table = rebuild()
+    print(f"Wrote {len(table)} city rollups to {core.DATA_DIR}")
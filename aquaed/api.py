@@ -0,0 +1,299 @@
+"""Headless JSON API for kiosk and mobile clients.
+
+Run with ``uvicorn aquaed.api:app --workers 4`` (or ``python -m aquaed.api``).
+OpenAI calls go through the shared ``AsyncOpenAI`` client. Handlers that
+only do blocking work (pandas lookups, SQLite, building indexes and rollups on
+first use) are plain ``def`` so FastAPI runs them in its thread pool; async
+handlers push their blocking calls to a thread with ``asyncio.to_thread`` so
+they never hold up the event loop.
+"""
+import asyncio
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from pydantic import BaseModel
+
+from aquaed import aggregates, core, images, nearby, timeseries, tts, water_data
+from aquaed.contaminants import get_index as get_contaminant_index
+from aquaed.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+app = FastAPI(title="AquaED API")
+
+
+class ImmutableStaticFiles(StaticFiles):
+    # Thumbnail names carry a content hash, so they never change in place
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code == 200:
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+app.mount("/static/img", ImmutableStaticFiles(directory=images.IMAGE_DIR, check_dir=False), name="images")
+
+
+class QuizAnswer(BaseModel):
+    question: str
+    answer: str
+
+
+class QuizSubmission(BaseModel):
+    answers: List[QuizAnswer]
+    language: str = "English"
+    explain: bool = False
+
+
+class RecommendationRequest(BaseModel):
+    zip_code: str
+    issues: str = ""
+    budget: str
+    is_parent: bool = False
+    is_renter: bool = False
+    is_senior: bool = False
+    is_eco_focused: bool = False
+    language: str = "English"
+    translate_products: bool = True
+
+
+def check_language(language):
+    if language not in core.LANGUAGES:
+        raise HTTPException(status_code=400, detail=f"Unsupported language: {language}")
+
+
+def parse_date(name, value):
+    if value is None:
+        return None
+    try:
+        parsed = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        parsed = pd.NaT
+    if pd.isna(parsed):
+        raise HTTPException(status_code=400, detail=f"{name} must be a date such as 2023-01-31")
+    return parsed
+
+
+def upstream_error(e):
+    return HTTPException(status_code=502, detail=f"Upstream request failed: {e}")
+
+
+def product_records(products):
+    columns = ["Product Name", "Type", "Price", "Best For", "Pros", "Cons", "Link", "Image_URL"]
+    return products[columns].to_dict(orient="records")
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "data_version": water_data.current().version[:12]}
+
+
+@app.get("/zip/{zip_code}")
+def zip_info(zip_code: int):
+    info = core.lookup_zip(zip_code)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Water quality score data could not be found for this location.")
+    return {**info, "summary": core.describe_quality(info), "city_facts": aggregates.city_facts(info["city"])}
+
+
+@app.get("/zip/{zip_code}/nearby")
+def zip_nearby(
+    zip_code: int,
+    k: int = Query(nearby.DEFAULT_K, ge=1, le=50),
+    radius_km: float = Query(nearby.DEFAULT_RADIUS_KM, gt=0),
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+):
+    comparison = nearby.compare(zip_code, lat, lon, k, radius_km)
+    if comparison is None:
+        raise HTTPException(status_code=404, detail=f"No centroid for {zip_code}")
+    return comparison
+
+
+@app.get("/zip/{zip_code}/trend")
+async def zip_trend(
+    zip_code: int,
+    contaminant: Optional[str] = None,
+    granularity: str = "month",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+):
+    if granularity not in timeseries.GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(timeseries.GRANULARITIES)}")
+    start, end = parse_date("start", start), parse_date("end", end)
+    rows = await asyncio.to_thread(timeseries.trend, zip_code, contaminant, granularity, start, end)
+    if rows.empty:
+        raise HTTPException(status_code=404, detail=f"No sampling history for {zip_code}")
+    rows = rows.assign(period=rows["period"].dt.strftime("%Y-%m-%d"))
+    return {"zip": zip_code, "granularity": granularity, "trend": rows.to_dict(orient="records")}
+
+
+@app.get("/cities")
+def cities():
+    return {"cities": [aggregates.city_facts(city) for city in aggregates.load().index]}
+
+
+@app.get("/cities/{city}")
+def city(city: str):
+    facts = aggregates.city_facts(city)
+    if facts is None:
+        raise HTTPException(status_code=404, detail=f"No data for {city}")
+    return {**facts, "summary": aggregates.describe_city(facts)}
+
+
+@app.get("/contaminants")
+def contaminants():
+    return {"contaminants": get_contaminant_index().vocabulary}
+
+
+@app.get("/contaminants/zips")
+def contaminant_zips(
+    contaminant: List[str] = Query(default=[]),
+    match: str = "all",
+    meets_epa: Optional[bool] = None,
+    city: Optional[str] = None,
+):
+    if match not in ("all", "any"):
+        raise HTTPException(status_code=400, detail="match must be 'all' or 'any'")
+    zips = get_contaminant_index().query(contaminant, match=match, meets_epa=meets_epa, city=city)
+    return {"count": len(zips), "zip_codes": zips}
+
+
+@app.get("/contaminants/top")
+def top_contaminants(n: int = 5, city: Optional[str] = None, meets_epa: Optional[bool] = None):
+    top = get_contaminant_index().top_contaminants(n, city=city, meets_epa=meets_epa)
+    return {"contaminants": [{"name": name, "zip_rows": count} for name, count in top]}
+
+
+@app.get("/geocode")
+async def geocode(lat: float, lon: float, issues: bool = False):
+    try:
+        zip_code = await asyncio.to_thread(core.get_zip, lat, lon)
+    except Exception as e:
+        raise upstream_error(e)
+    if not zip_code:
+        raise HTTPException(status_code=404, detail="Could not determine ZIP code from selected location.")
+    result = {"zip_code": zip_code, "quality": await asyncio.to_thread(core.lookup_zip, zip_code)}
+    if issues:
+        try:
+            result["issues"] = await core.aget_city_issues(zip_code)
+        except Exception as e:
+            raise upstream_error(e)
+    return result
+
+
+@app.get("/fun-fact")
+async def fun_fact(city: str, language: str = "English"):
+    check_language(language)
+    if not city.strip() or len(city) > core.MAX_CITY_CHARS:
+        raise HTTPException(status_code=400, detail=f"city must be 1 to {core.MAX_CITY_CHARS} characters")
+    try:
+        return {"city": city, "fact": await core.aget_fun_fact(city, language)}
+    except Exception as e:
+        raise upstream_error(e)
+
+
+@app.get("/faq")
+def faq_questions():
+    return {"questions": core.FAQ_QUESTIONS}
+
+
+@app.get("/faq/answer")
+async def faq_answer(question: str, language: str = "English"):
+    check_language(language)
+    # Only the curated questions, so the endpoint can't be used as a free LLM proxy
+    if question not in core.FAQ_QUESTIONS:
+        raise HTTPException(status_code=400, detail="question must be one of GET /faq")
+    try:
+        return {"question": question, "answer": await core.aanswer_faq(question, language)}
+    except Exception as e:
+        raise upstream_error(e)
+
+
+@app.get("/tts")
+async def speech(text: str, voice: str = tts.DEFAULT_VOICE):
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="text must not be empty")
+    if len(text) > tts.MAX_TEXT_CHARS:
+        raise HTTPException(status_code=400, detail=f"text must be at most {tts.MAX_TEXT_CHARS} characters")
+    # Chunks are sent as soon as each one is synthesized, so playback can start
+    # early. The first one is awaited here so an upstream failure is still a 502.
+    chunks = tts.astream_speech(text, voice)
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = b""
+    except Exception as e:
+        await chunks.aclose()
+        raise upstream_error(e)
+
+    async def body():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+    return StreamingResponse(body(), media_type="audio/mpeg")
+
+
+@app.get("/quiz")
+def quiz(k: int = core.MAX_QUESTIONS, language: str = "English"):
+    if k < 1:
+        raise HTTPException(status_code=400, detail="k must be at least 1")
+    check_language(language)
+    questions = core.sample_quiz(k, language)
+    return {"questions": [{"question": q["question"], "options": q["options"], "topic": q["topic"]} for q in questions]}
+
+
+@app.post("/quiz/score")
+async def quiz_score(submission: QuizSubmission):
+    check_language(submission.language)
+    questions = []
+    for item in submission.answers:
+        q = await asyncio.to_thread(core.find_question, item.question)
+        if q is None:
+            raise HTTPException(status_code=400, detail=f"Unknown question: {item.question}")
+        questions.append(q)
+
+    results = [
+        {"question": q["question"], "answer": item.answer, "correct_answer": q["answer"], "correct": item.answer == q["answer"]}
+        for q, item in zip(questions, submission.answers)
+    ]
+    if submission.explain:
+        explanations = await asyncio.gather(*[
+            core.agenerate_explanation(q["question"], q["answer"], submission.language)
+            for q in questions
+        ])
+        for result, explanation in zip(results, explanations):
+            result["explanation"] = explanation
+
+    score = core.score_quiz(questions, [item.answer for item in submission.answers])
+    return {"score": score, "total": len(questions), "results": results}
+
+
+@app.post("/recommendations")
+async def recommendations(request: RecommendationRequest):
+    check_language(request.language)
+    if request.budget not in core.BUDGET_MAPPING:
+        raise HTTPException(status_code=400, detail=f"Unknown budget: {request.budget}")
+
+    user_traits = core.describe_traits(request.is_parent, request.is_renter, request.is_senior, request.is_eco_focused)
+    products = await asyncio.to_thread(core.filter_products, request.budget)
+    calls = [core.arecommend_filters(request.zip_code, request.issues, request.budget, user_traits, request.language)]
+    if request.translate_products and not products.empty:
+        calls.append(core.atranslate_products(products, request.language))
+    try:
+        results = await asyncio.gather(*calls)
+    except Exception as e:
+        raise upstream_error(e)
+
+    return {
+        "recommendations": results[0],
+        "products": product_records(products),
+        "translated_products": results[1] if len(results) > 1 else [],
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("aquaed.api:app", host="0.0.0.0", port=8000)
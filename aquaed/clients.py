@@ -0,0 +1,70 @@
+"""Process-wide OpenAI clients and a shared worker pool.
+
+Every Streamlit session and every API request goes through the same
+``OpenAI``/``AsyncOpenAI`` instances, so keep-alive connections to the API are
+reused instead of each rerun opening its own pool.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from aquaed import replay
+from aquaed.lazy import lazy_import
+
+# Imported on first client construction, not when the module loads
+httpx = lazy_import("httpx")
+openai = lazy_import("openai")
+
+MAX_CONNECTIONS = int(os.environ.get("AQUAED_OPENAI_MAX_CONNECTIONS", "64"))
+MAX_KEEPALIVE = int(os.environ.get("AQUAED_OPENAI_MAX_KEEPALIVE", "32"))
+KEEPALIVE_EXPIRY = float(os.environ.get("AQUAED_OPENAI_KEEPALIVE_EXPIRY", "60"))
+FAN_OUT_WORKERS = int(os.environ.get("AQUAED_FAN_OUT_WORKERS", "16"))
+
+
+def _timeout():
+    return httpx.Timeout(60.0, connect=5.0)
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def _api_key():
+    from aquaed.core import get_secret
+    return get_secret("OPENAI_API_KEY")
+
+
+# The transports are wrapped so aquaed.replay can record or replay requests;
+# outside a trace they are passed through unchanged
+@lru_cache(maxsize=None)
+def get_openai_client():
+    transport = replay.wrap_transport(httpx.HTTPTransport(limits=_limits()))
+    http_client = httpx.Client(timeout=_timeout(), transport=transport)
+    return openai.OpenAI(api_key=_api_key(), http_client=http_client)
+
+
+@lru_cache(maxsize=None)
+def get_async_openai_client():
+    # httpx.AsyncClient is not bound to a loop until first use, so one instance
+    # serves the API's event loop for the life of the process.
+    transport = replay.wrap_async_transport(httpx.AsyncHTTPTransport(limits=_limits()))
+    http_client = httpx.AsyncClient(timeout=_timeout(), transport=transport)
+    return openai.AsyncOpenAI(api_key=_api_key(), http_client=http_client)
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    return ThreadPoolExecutor(max_workers=FAN_OUT_WORKERS, thread_name_prefix="aquaed-fanout")
+
+
+def fan_out(*calls):
+    """Run independent zero-argument callables concurrently and return their
+    results in order. The first exception raised is re-raised."""
+    if len(calls) == 1:
+        return [calls[0]()]
+    futures = [get_executor().submit(call) for call in calls]
+    return [future.result() for future in futures]
@@ -0,0 +1,92 @@
+"""Inverted index over the "Common Contaminants" column.
+
+The comma lists are parsed once into a vocabulary, and every contaminant,
+city and EPA outcome maps to a bitset (a Python int) over the dataset's rows.
+Queries such as "ZIPs with Lead that fail EPA" or "top contaminants in
+Oakland" are a few AND/popcount operations instead of a table scan.
+"""
+import threading
+
+from aquaed import core
+
+
+def iter_bits(bits):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class ContaminantIndex:
+    def __init__(self, df):
+        self.zips = [int(z) for z in df["ZIP Code"]]
+        self.cities = list(df["City"])
+        self.all = (1 << len(self.zips)) - 1
+        self.by_contaminant = {}
+        self.by_city = {}
+        self.by_zip = {}
+        self.epa_pass = 0
+        for row, (zip_code, city, contaminants, epa) in enumerate(
+            zip(self.zips, self.cities, df["Common Contaminants"], df["Meets EPA Standards"])
+        ):
+            bit = 1 << row
+            for name in core.split_contaminants(contaminants):
+                self.by_contaminant[name] = self.by_contaminant.get(name, 0) | bit
+            self.by_city[city] = self.by_city.get(city, 0) | bit
+            self.by_zip[zip_code] = self.by_zip.get(zip_code, 0) | bit
+            if epa == "Yes":
+                self.epa_pass |= bit
+        self.vocabulary = sorted(self.by_contaminant)
+
+    def rows(self, contaminants=(), match="all", meets_epa=None, city=None):
+        """Bitset of rows matching every given filter. ``match`` decides
+        whether rows need all or any of ``contaminants``."""
+        bits = self.all
+        if contaminants:
+            sets = [self.by_contaminant.get(name, 0) for name in contaminants]
+            if match == "any":
+                combined = 0
+                for s in sets:
+                    combined |= s
+            else:
+                combined = self.all
+                for s in sets:
+                    combined &= s
+            bits &= combined
+        if meets_epa is not None:
+            bits &= self.epa_pass if meets_epa else self.all & ~self.epa_pass
+        if city is not None:
+            bits &= self.by_city.get(city, 0)
+        return bits
+
+    def query(self, contaminants=(), match="all", meets_epa=None, city=None):
+        """Sorted, distinct ZIP codes matching the filters."""
+        return sorted({self.zips[row] for row in iter_bits(self.rows(contaminants, match, meets_epa, city))})
+
+    def count(self, contaminants=(), match="all", meets_epa=None, city=None):
+        return self.rows(contaminants, match, meets_epa, city).bit_count()
+
+    def top_contaminants(self, n=5, city=None, meets_epa=None):
+        """``[(contaminant, rows), ...]`` for the most frequent contaminants."""
+        scope = self.rows(meets_epa=meets_epa, city=city)
+        counts = [(name, (bits & scope).bit_count()) for name, bits in self.by_contaminant.items()]
+        counts = [item for item in counts if item[1]]
+        counts.sort(key=lambda item: (-item[1], item[0]))
+        return counts[:n]
+
+    def zip_contaminants(self, zip_code):
+        bits = self.by_zip.get(int(zip_code), 0)
+        return [name for name in self.vocabulary if self.by_contaminant[name] & bits]
+
+
+_lock = threading.Lock()
+_index = {}
+
+
+def get_index():
+    """Index for the currently loaded water data, rebuilt when it changes."""
+    df = core.load_water_data()
+    with _lock:
+        if _index.get("source") is not df:
+            _index.update(source=df, index=ContaminantIndex(df))
+        return _index["index"]
@@ -0,0 +1,555 @@
+import asyncio
+import os
+import random
+import time
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+from aquaed import prompt_cache, replay, resilience, shared_cache
+from aquaed.clients import get_async_openai_client, get_openai_client
+from aquaed.lazy import lazy_import
+
+pd = lazy_import("pandas")
+requests = lazy_import("requests")
+
+# --- Load environment variables ---
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WATER_DATA_PATH = os.path.join(BASE_DIR, "bayareawater.csv")
+PRODUCTS_PATH = os.path.join(BASE_DIR, "water_filter_recommendations_detailed.csv")
+QUESTIONS_PATH = os.path.join(BASE_DIR, "questions.json")
+# Files generated at runtime (city rollups, the shared cache); kept out of
+# the repo and out of the world-writable temp dir
+DATA_DIR = os.environ.get("AQUAED_DATA_DIR") or os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "aquaed"
+)
+
+LANGUAGES = ("English", "Spanish", "Vietnamese", "Mandarin", "Korean")
+# Longest free-text city name accepted for a fun fact
+MAX_CITY_CHARS = 80
+MAX_QUESTIONS = 3
+
+BUDGET_MAPPING = {
+    "Under $50": 50,
+    "$50–$100": 100,
+    "$100–$200": 200,
+    "Over $200": float('inf')
+}
+
+FAQ_QUESTIONS = [
+    "What is pH in water?",
+    "How can I measure water quality at home?",
+    "Why is chlorine added to water?",
+    "What are nitrates and why are they bad?",
+    "How is my water cleaned?",
+    "What are safe levels of lead in water?",
+    "Where are the water treatment plants in Santa Clara County?"
+]
+
+DEFAULT_SYSTEM_PROMPT = "You are an expert on water quality."
+FAQ_SYSTEM_PROMPT = "Expert in Santa Clara County water quality and Valley Water services."
+EXPLANATION_SYSTEM_PROMPT = "You are a water educator."
+RECOMMENDATION_SYSTEM_PROMPT = "You are a water quality expert."
+TRANSLATION_SYSTEM_PROMPT = "You are a professional translator."
+MAP_SYSTEM_PROMPT = (
+    "Reply with a list of four issues regarding water quality for the user's given city correlating with their zip code response. "
+    "You must mention the name of the city. Each entry in the list should be no more than 4 sentences long. "
+    "Details should be specific to the location. "
+    "Please add 'Continue exploring the app to see what solutions might work for you at home!' at the end of your response."
+)
+
+
+_MISSING = object()
+
+
+def get_secret(name, default=_MISSING):
+    # Environment first so the API can run without a Streamlit secrets file
+    value = os.environ.get(name)
+    if value:
+        return value
+    import streamlit as st
+    try:
+        return st.secrets[name]
+    except Exception:
+        if default is _MISSING:
+            raise
+        return default
+
+
+def private_dir(path):
+    """``path``, created private to this user if it doesn't exist. A
+    directory owned by someone else is refused."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if hasattr(os, "getuid") and os.stat(path).st_uid != os.getuid():
+        raise PermissionError(f"{path} is not owned by the current user")
+    return path
+
+
+def data_dir():
+    return private_dir(DATA_DIR)
+
+
+# --- Data loaders (shared by the Streamlit app and the API) ---
+def load_water_data():
+    # The current snapshot; aquaed.water_data swaps in new versions of the file
+    from aquaed import water_data
+    return water_data.current().df
+
+
+@lru_cache(maxsize=None)
+def load_products():
+    return pd.read_csv(PRODUCTS_PATH)
+
+
+# --- LLM helpers ---
+def chat_messages(prompt, system):
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def record_usage(site, model, started, completion):
+    from aquaed.routing import get_router
+    usage = completion.usage
+    get_router().record(
+        site, model, time.perf_counter() - started,
+        usage.prompt_tokens if usage else 0, usage.completion_tokens if usage else 0
+    )
+
+
+def completion_key(prompt, system, site):
+    return shared_cache.make_key(site, system, prompt)
+
+
+def trace_cache_hit(prompt, system, answer):
+    # Replay starts with cold caches, so a cached answer still goes in the
+    # trace under the request a cache miss would send (see aquaed.replay)
+    if replay.MODE == "record":
+        replay.record_cached_completion(chat_messages(prompt(), system), answer)
+
+
+# The model is picked per call site by aquaed.routing unless given. Calls are
+# hedged and go through the circuit breaker (see aquaed.resilience);
+# ``fallback`` returns cached or precomputed content when OpenAI is degraded.
+# Answers are shared with other server processes through aquaed.shared_cache.
+def get_completion(prompt, system=DEFAULT_SYSTEM_PROMPT, site="default", model=None, fallback=None):
+    from aquaed.routing import get_router
+    key = completion_key(prompt, system, site)
+    cached = shared_cache.fetch_text("llm", key)
+    if cached is not None:
+        trace_cache_hit(lambda: prompt, system, cached)
+        return cached
+    model = model or get_router().choose(site)
+
+    def call(candidate):
+        started = time.perf_counter()
+        completion = get_openai_client().chat.completions.create(
+            model=candidate,
+            messages=chat_messages(prompt, system),
+            timeout=resilience.LATENCY_BUDGETS.get(candidate, resilience.DEFAULT_BUDGET)
+        )
+        record_usage(site, candidate, started, completion)
+        return completion.choices[0].message.content
+    answer = resilience.guarded(call, model, fallback)
+    if not isinstance(answer, resilience.FallbackText):
+        shared_cache.store_text("llm", key, answer)
+    return answer
+
+
+async def aget_completion(prompt, system=DEFAULT_SYSTEM_PROMPT, site="default", model=None, fallback=None):
+    from aquaed.routing import get_router
+    key = completion_key(prompt, system, site)
+    # The shared cache may be a network round trip; keep it off the event loop
+    cached = await asyncio.to_thread(shared_cache.fetch_text, "llm", key)
+    if cached is not None:
+        trace_cache_hit(lambda: prompt, system, cached)
+        return cached
+    model = model or get_router().choose(site)
+
+    async def call(candidate):
+        started = time.perf_counter()
+        completion = await get_async_openai_client().chat.completions.create(
+            model=candidate,
+            messages=chat_messages(prompt, system),
+            timeout=resilience.LATENCY_BUDGETS.get(candidate, resilience.DEFAULT_BUDGET)
+        )
+        record_usage(site, candidate, started, completion)
+        return completion.choices[0].message.content
+    answer = await resilience.aguarded(call, model, fallback)
+    if not isinstance(answer, resilience.FallbackText):
+        await asyncio.to_thread(shared_cache.store_text, "llm", key, answer)
+    return answer
+
+
+def synthesize_speech(text, voice="nova"):
+    response = get_openai_client().audio.speech.create(
+        model="tts-1",
+        voice=voice,
+        input=text
+    )
+    return response.read()
+
+
+async def asynthesize_speech(text, voice="nova"):
+    response = await get_async_openai_client().audio.speech.create(
+        model="tts-1",
+        voice=voice,
+        input=text
+    )
+    return response.read()
+
+
+# --- Fun facts and FAQs ---
+def fun_fact_prompt(city, language):
+    return (
+        f"Give one short, interesting fun fact about {city}'s water quality. "
+        f"Translate into {language}. Start it with 'Did you know?'"
+    )
+
+
+# Free-text city input is canonicalized so "san jose " and "San José, CA" share one cached fact
+def fun_fact_fallback(city):
+    from aquaed import aggregates
+    facts = aggregates.city_facts(city)
+    if facts is None:
+        return resilience.FallbackText("Did you know? Most tap water in the Bay Area is tested hundreds of times a month before it reaches your faucet.")
+    return resilience.FallbackText(f"Did you know? {aggregates.describe_city(facts)}")
+
+
+def get_fun_fact(city, language="English"):
+    city = prompt_cache.canonical_city(city) or city.strip()
+    fact = prompt_cache.fun_facts.get(language, city)
+    if fact is not None:
+        trace_cache_hit(lambda: fun_fact_prompt(city, language), DEFAULT_SYSTEM_PROMPT, fact)
+    else:
+        fact = get_completion(fun_fact_prompt(city, language), site="fun_fact", fallback=lambda: fun_fact_fallback(city))
+        if not isinstance(fact, resilience.FallbackText):
+            prompt_cache.fun_facts.put(language, city, fact)
+    return fact
+
+
+async def aget_fun_fact(city, language="English"):
+    # The first call loads the city list; keep it off the event loop
+    city = await asyncio.to_thread(prompt_cache.canonical_city, city) or city.strip()
+    fact = prompt_cache.fun_facts.get(language, city)
+    if fact is not None:
+        trace_cache_hit(lambda: fun_fact_prompt(city, language), DEFAULT_SYSTEM_PROMPT, fact)
+    else:
+        fact = await aget_completion(fun_fact_prompt(city, language), site="fun_fact", fallback=lambda: fun_fact_fallback(city))
+        if not isinstance(fact, resilience.FallbackText):
+            prompt_cache.fun_facts.put(language, city, fact)
+    return fact
+
+
+def faq_prompt(question, language):
+    translation_note = f"Translate into {language}." if language != "English" else ""
+    return f"Answer '{question}' with bullet points based on Santa Clara County. {translation_note}."
+
+
+# Last good answer per (question, language), served while OpenAI is unavailable
+_faq_answers = {}
+FAQ_ANSWERS_MAX = 512
+
+
+def remember_faq(question, language, answer):
+    if len(_faq_answers) >= FAQ_ANSWERS_MAX and (question, language) not in _faq_answers:
+        _faq_answers.pop(next(iter(_faq_answers)), None)
+    _faq_answers[(question, language)] = answer
+    return answer
+
+
+def faq_fallback(question, language):
+    answer = _faq_answers.get((question, language))
+    if answer is None:
+        raise resilience.CircuitOpenError("OpenAI is temporarily unavailable, please try again shortly.")
+    return resilience.FallbackText(answer)
+
+
+def answer_faq(question, language="English"):
+    answer = get_completion(
+        faq_prompt(question, language), system=FAQ_SYSTEM_PROMPT, site="faq",
+        fallback=lambda: faq_fallback(question, language)
+    )
+    return remember_faq(question, language, answer)
+
+
+async def aanswer_faq(question, language="English"):
+    answer = await aget_completion(
+        faq_prompt(question, language), system=FAQ_SYSTEM_PROMPT, site="faq",
+        fallback=lambda: faq_fallback(question, language)
+    )
+    return remember_faq(question, language, answer)
+
+
+# --- Quiz ---
+def sample_quiz(k=MAX_QUESTIONS, language="English", rng=random):
+    from aquaed.question_bank import get_question_bank
+    return get_question_bank().sample(k, language=language, rng=rng)
+
+
+def score_quiz(questions, answers):
+    return sum(1 for q, answer in zip(questions, answers) if answer == q["answer"])
+
+
+def find_question(question_text):
+    from aquaed.question_bank import get_question_bank
+    return get_question_bank().find(question_text)
+
+
+def explanation_prompt(question_text, correct_answer, language):
+    return (
+        f"Question: {question_text}\n"
+        f"Correct Answer: {correct_answer}\n"
+        f"Explain why this is the correct answer. Translate to {language}."
+    )
+
+
+def generate_explanation(question_text, correct_answer, language="English"):
+    try:
+        return get_completion(
+            explanation_prompt(question_text, correct_answer, language),
+            system=EXPLANATION_SYSTEM_PROMPT,
+            site="quiz_explanation"
+        ).strip()
+    except Exception as e:
+        return f"❌ Could not generate explanation: {e}"
+
+
+async def agenerate_explanation(question_text, correct_answer, language="English"):
+    try:
+        explanation = await aget_completion(
+            explanation_prompt(question_text, correct_answer, language),
+            system=EXPLANATION_SYSTEM_PROMPT,
+            site="quiz_explanation"
+        )
+        return explanation.strip()
+    except Exception as e:
+        return f"❌ Could not generate explanation: {e}"
+
+
+# --- Filter recommendations ---
+def describe_traits(is_parent=False, is_renter=False, is_senior=False, is_eco_focused=False):
+    traits = []
+    if is_parent: traits.append("parent with young children")
+    if is_renter: traits.append("renter")
+    if is_senior: traits.append("senior citizen")
+    if is_eco_focused: traits.append("eco-conscious")
+    return ", ".join(traits) if traits else "general user"
+
+
+def known_contaminants(zip_code):
+    from aquaed.contaminants import get_index
+    try:
+        return get_index().zip_contaminants(int(zip_code))
+    except (TypeError, ValueError):
+        return []
+
+
+def recommendation_prompt(zip_code, issues, budget, user_traits, language):
+    contaminants = known_contaminants(zip_code)
+    reported = f"Contaminants reported for this ZIP code: {', '.join(contaminants)}." if contaminants else ""
+    return f"""
+    You are a helpful assistant. The user lives in ZIP code {zip_code}.
+    {reported}
+    Water issues: {issues}.
+    Budget: {budget}.
+    Traits: {user_traits}.
+    Provide a brief water quality concern summary and filter system recommendations.
+    Translate into {language}.
+    """
+
+
+# Everything but the issue description must match exactly; the description
+# is matched as a near-duplicate
+def recommendation_key(zip_code, budget, user_traits, language):
+    return (str(zip_code).strip(), budget, user_traits, language)
+
+
+def recommendation_fallback(zip_code, budget):
+    contaminants = known_contaminants(zip_code)
+    reported = (
+        f"Contaminants reported for ZIP code {zip_code}: {', '.join(contaminants)}. "
+        if contaminants else ""
+    )
+    return resilience.FallbackText(
+        "Our AI advisor is temporarily unavailable, so this is a general summary. "
+        f"{reported}The filters below fit your budget ({budget}); check each product's certifications "
+        "against the contaminants you are concerned about."
+    )
+
+
+def recommend_filters(zip_code, issues, budget, user_traits, language="English"):
+    key = recommendation_key(zip_code, budget, user_traits, language)
+    text = prompt_cache.recommendations.get(key, issues)
+    if text is not None:
+        trace_cache_hit(
+            lambda: recommendation_prompt(zip_code, issues, budget, user_traits, language),
+            RECOMMENDATION_SYSTEM_PROMPT, text
+        )
+    else:
+        text = get_completion(
+            recommendation_prompt(zip_code, issues, budget, user_traits, language),
+            system=RECOMMENDATION_SYSTEM_PROMPT,
+            site="recommendation",
+            fallback=lambda: recommendation_fallback(zip_code, budget)
+        )
+        if not isinstance(text, resilience.FallbackText):
+            prompt_cache.recommendations.put(key, issues, text)
+    return text
+
+
+async def arecommend_filters(zip_code, issues, budget, user_traits, language="English"):
+    key = recommendation_key(zip_code, budget, user_traits, language)
+    text = await asyncio.to_thread(prompt_cache.recommendations.get, key, issues)
+    if text is not None:
+        trace_cache_hit(
+            lambda: recommendation_prompt(zip_code, issues, budget, user_traits, language),
+            RECOMMENDATION_SYSTEM_PROMPT, text
+        )
+    else:
+        # Builds the contaminant index on first use
+        prompt = await asyncio.to_thread(recommendation_prompt, zip_code, issues, budget, user_traits, language)
+        text = await aget_completion(
+            prompt,
+            system=RECOMMENDATION_SYSTEM_PROMPT,
+            site="recommendation",
+            fallback=lambda: recommendation_fallback(zip_code, budget)
+        )
+        if not isinstance(text, resilience.FallbackText):
+            await asyncio.to_thread(prompt_cache.recommendations.put, key, issues, text)
+    return text
+
+
+def filter_products(budget):
+    product_df = load_products()
+    return product_df[product_df["Price_Value"] <= BUDGET_MAPPING[budget]]
+
+
+def product_text(products):
+    return "\n\n".join([
+        f"Name: {row['Product Name']}\nDescription: {row['Description']}\nPrice: {row['Price']}\nPros: {row['Pros']}\nCons: {row['Cons']}\nLink: {row['Link']}"
+        for _, row in products.iterrows()
+    ])
+
+
+def product_translation_prompt(products, language):
+    return f"Translate this product information into {language}:\n\n{product_text(products)}"
+
+
+def translate_products(products, language="English"):
+    translated_text = get_completion(
+        product_translation_prompt(products, language),
+        system=TRANSLATION_SYSTEM_PROMPT,
+        site="product_translation",
+        # Untranslated beats nothing while OpenAI is unavailable
+        fallback=lambda: resilience.FallbackText(product_text(products))
+    )
+    return translated_text.split("\n\n")
+
+
+async def atranslate_products(products, language="English"):
+    translated_text = await aget_completion(
+        product_translation_prompt(products, language),
+        system=TRANSLATION_SYSTEM_PROMPT,
+        site="product_translation",
+        # Untranslated beats nothing while OpenAI is unavailable
+        fallback=lambda: resilience.FallbackText(product_text(products))
+    )
+    return translated_text.split("\n\n")
+
+
+# --- ZIP lookup and reverse geocoding ---
+# Coordinates are rounded to ~1 m so repeated clicks on one spot share a cache entry
+GEOCODE_PRECISION = 5
+
+
+def get_zip(lat, lon):
+    lat, lon = round(float(lat), GEOCODE_PRECISION), round(float(lon), GEOCODE_PRECISION)
+    key = shared_cache.make_key(lat, lon)
+    cached = shared_cache.fetch_text("geocode", key)
+    if cached is not None:
+        replay.record_cached_geocode(lat, lon, cached)
+        return cached
+    url = f"https://maps.googleapis.com/maps/api/geocode/json?latlng={lat},{lon}&key={get_secret('GOOGLEMAPS_API_KEY')}"
+    data = replay.geocode(lat, lon, lambda: requests.get(url, timeout=10).json())
+    if data["status"] == "OK":
+        for component in data["results"][0]["address_components"]:
+            if "postal_code" in component["types"]:
+                shared_cache.store_text("geocode", key, component["short_name"])
+                return component["short_name"]
+    return None
+
+
+def lookup_zip(zip_code):
+    df = load_water_data()
+    match = df[df["ZIP Code"] == int(zip_code)]
+    if match.empty:
+        return None
+    entry = match.iloc[0]
+    return {
+        "city": entry["City"],
+        "zip_code": int(entry["ZIP Code"]),
+        "score": int(entry["Water Quality Score"]),
+        "contaminants": entry["Common Contaminants"],
+        "meets_epa": entry["Meets EPA Standards"] == "Yes",
+    }
+
+
+def split_contaminants(value):
+    if not isinstance(value, str):
+        return []
+    return [c.strip() for c in value.split(",") if c.strip()]
+
+
+def describe_quality(info):
+    metro = info["city"]
+    epa_status = "does" if info["meets_epa"] else "does not"
+    return (
+        f"{metro} (ZIP code {info['zip_code']}) has a water quality score of {info['score']}, which {epa_status} meet EPA standards. "
+        f"Some common contaminants in {metro}'s water include: {info['contaminants']}."
+    )
+
+
+def city_issues_prompt(zip_code):
+    # Ground the answer in the precomputed city rollups when we have them
+    from aquaed import aggregates
+    info = lookup_zip(zip_code)
+    facts = aggregates.city_facts(info["city"]) if info else None
+    if facts is None:
+        return str(zip_code)
+    return (
+        f"{zip_code}\n"
+        f"Known data for this ZIP: score {info['score']}, meets EPA: {'yes' if info['meets_epa'] else 'no'}, contaminants: {info['contaminants']}.\n"
+        f"{aggregates.prompt_facts(facts)}"
+    )
+
+
+def city_issues_fallback(zip_code):
+    from aquaed import aggregates
+    info = lookup_zip(zip_code)
+    facts = aggregates.city_facts(info["city"]) if info else None
+    if facts is None:
+        raise resilience.CircuitOpenError("OpenAI is temporarily unavailable, please try again shortly.")
+    return resilience.FallbackText(
+        f"{aggregates.describe_city(facts)}\n\n"
+        "Continue exploring the app to see what solutions might work for you at home!"
+    )
+
+
+def get_city_issues(zip_code):
+    return get_completion(
+        city_issues_prompt(zip_code), system=MAP_SYSTEM_PROMPT, site="city_issues",
+        fallback=lambda: city_issues_fallback(zip_code)
+    )
+
+
+async def aget_city_issues(zip_code):
+    # Reads the water data and city rollups, which may be built on first use
+    prompt = await asyncio.to_thread(city_issues_prompt, zip_code)
+    return await aget_completion(
+        prompt, system=MAP_SYSTEM_PROMPT, site="city_issues",
+        fallback=lambda: city_issues_fallback(zip_code)
+    )
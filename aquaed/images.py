@@ -0,0 +1,139 @@
+"""Locally cached, pre-resized WebP copies of the app's remote images.
+
+``python -m aquaed.images`` downloads the home page images, the logo and every
+product ``Image_URL`` once and writes WebP thumbnails at the widths the pages
+display them (plus 2x for high-DPI screens) to ``static/img``. File names
+carry a content hash, so they can be cached forever. ``static/img/manifest.json``
+maps each source URL to its thumbnails; images that haven't been built fall
+back to the remote URL.
+"""
+import hashlib
+import html
+import io
+import json
+import os
+import sys
+import threading
+
+from aquaed import core
+from aquaed.lazy import lazy_import
+
+requests = lazy_import("requests")
+
+STATIC_DIR = os.path.join(core.BASE_DIR, "static")
+IMAGE_DIR = os.path.join(STATIC_DIR, "img")
+MANIFEST_PATH = os.path.join(IMAGE_DIR, "manifest.json")
+# URL prefix Streamlit serves ``static/`` under when server.enableStaticServing is on
+STATIC_URL = os.environ.get("AQUAED_STATIC_URL", "app/static")
+WEBP_QUALITY = 80
+
+HOME_WIDTH = 450
+LOGO_WIDTH = 500
+PRODUCT_WIDTH = 500
+
+LOGO_URL = "https://i.imgur.com/KpJbbvV.png"
+HOME_IMAGES = [
+    "https://i.imgur.com/sfixLBQ.png",  # pouring water
+    "https://i.imgur.com/iQEoOxk.png",  # washing fruits
+    "https://i.imgur.com/EFO5i7u.png",  # faucet
+    "https://i.imgur.com/cQ17Ktm.png",  # flower on water
+    "https://i.imgur.com/JwXE4Iw.png",  # child drinking water
+    "https://i.imgur.com/WPmxxfk.png",  # child drinking water
+]
+
+_lock = threading.Lock()
+_manifest = {}
+
+
+def sources():
+    """``[(url, display_width), ...]`` for every image the app shows."""
+    items = [(LOGO_URL, LOGO_WIDTH)] + [(url, HOME_WIDTH) for url in HOME_IMAGES]
+    items += [(url, PRODUCT_WIDTH) for url in core.load_products()["Image_URL"].dropna().unique()]
+    return items
+
+
+def thumbnails(data, width):
+    """WebP encodings of ``data`` at 1x and 2x ``width``, never upscaled."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        out = {}
+        for target in sorted({min(width, image.width), min(2 * width, image.width)}):
+            height = round(image.height * target / image.width)
+            buffer = io.BytesIO()
+            image.resize((target, height), Image.LANCZOS).save(buffer, "WEBP", quality=WEBP_QUALITY, method=6)
+            out[target] = buffer.getvalue()
+        return out
+
+
+def write_atomic(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build(items=None, force=False):
+    """Download and resize every source image; returns the new manifest.
+    Entries already in the manifest are kept unless ``force`` is set."""
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    manifest = {} if force else dict(load_manifest())
+    for url, width in items if items is not None else sources():
+        if url in manifest and int(manifest[url]["width"]) == width:
+            continue
+        try:
+            response = requests.get(url, timeout=30)
+            response.raise_for_status()
+            resized = thumbnails(response.content, width)
+        except Exception as e:
+            print(f"Skipping {url}: {e}", file=sys.stderr)
+            continue
+        files = {}
+        for size, data in resized.items():
+            name = f"{hashlib.sha256(data).hexdigest()[:16]}-{size}.webp"
+            write_atomic(os.path.join(IMAGE_DIR, name), data)
+            files[str(size)] = name
+        manifest[url] = {"width": width, "files": files}
+    write_atomic(MANIFEST_PATH, json.dumps(manifest, indent=1, sort_keys=True).encode())
+    return manifest
+
+
+def load_manifest():
+    try:
+        mtime = os.stat(MANIFEST_PATH).st_mtime_ns
+    except OSError:
+        return {}
+    with _lock:
+        if _manifest.get("mtime") != mtime:
+            with open(MANIFEST_PATH) as f:
+                _manifest.update(mtime=mtime, entries=json.load(f))
+        return _manifest["entries"]
+
+
+def srcset(url):
+    """``(src, srcset)`` for the local thumbnails of ``url``, or ``(url, None)``
+    when it hasn't been built."""
+    entry = load_manifest().get(url)
+    if not entry:
+        return url, None
+    files = sorted(entry["files"].items(), key=lambda item: int(item[0]))
+    src = f"{STATIC_URL}/img/{files[0][1]}"
+    if len(files) == 1:
+        return src, None
+    return src, ", ".join(f"{STATIC_URL}/img/{name} {size}w" for size, name in files)
+
+
+def img_tag(url, width, alt="", style="", lazy=True):
+    src, candidates = srcset(url)
+    attrs = [f'src="{html.escape(src)}"', f'alt="{html.escape(alt)}"', f'style="width: {width}px; max-width: 100%; height: auto; {style}"']
+    if candidates:
+        attrs.append(f'srcset="{html.escape(candidates)}" sizes="{width}px"')
+    if lazy:
+        attrs.append('loading="lazy" decoding="async"')
+    return f"<img {' '.join(attrs)}>"
+
+
+if __name__ == "__main__":
+    manifest = build(force="--force" in sys.argv[1:])
+    print(f"{len(manifest)} images in {MANIFEST_PATH}")
@@ -0,0 +1,105 @@
+"""Import-time and startup memory report.
+
+Each module is imported in a fresh interpreter with ``-X importtime`` so the
+numbers reflect a cold start, the same as a newly scaled-out replica::
+
+    python -m aquaed.importprof                  # default app dependencies
+    python -m aquaed.importprof folium fpdf      # specific modules
+    python -m aquaed.importprof --json > importprof.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+from collections import defaultdict
+
+from aquaed.core import BASE_DIR
+
+DEFAULT_TARGETS = [
+    "aquaed.core",
+    "aquaed.api",
+    "streamlit",
+    "openai",
+    "pandas",
+    "requests",
+    "folium",
+    "streamlit_folium",
+    "fpdf",
+]
+
+# Prints peak RSS in KiB (Linux) after the import has run
+RSS_SNIPPET = "import resource; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+
+
+def parse_importtime(stderr):
+    """Return ``(total_us, self_us_by_package)`` from ``-X importtime`` output."""
+    total_us = 0
+    by_package = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.rstrip()
+        package = name.strip().split(".")[0]
+        by_package[package] += int(self_us)
+        if not name.startswith("  "):
+            # Top-level entries only, so nested imports aren't double counted
+            total_us += int(cumulative_us)
+    return total_us, dict(by_package)
+
+
+def profile_import(target):
+    code = f"import {target}; {RSS_SNIPPET}" if target else RSS_SNIPPET
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BASE_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return {"module": target, "error": result.stderr.strip().splitlines()[-1]}
+    total_us, by_package = parse_importtime(result.stderr)
+    return {
+        "module": target,
+        "import_ms": total_us / 1000,
+        "rss_mb": int(result.stdout.strip().splitlines()[-1]) / 1024,
+        "packages_ms": {name: us / 1000 for name, us in sorted(by_package.items(), key=lambda item: -item[1])},
+    }
+
+
+def profile(targets):
+    baseline = profile_import(None)
+    reports = [profile_import(target) for target in targets]
+    for report in reports:
+        if "rss_mb" in report:
+            report["import_ms"] -= baseline["import_ms"]
+            report["rss_delta_mb"] = report["rss_mb"] - baseline["rss_mb"]
+    return {"baseline": baseline, "modules": reports}
+
+
+def format_report(result, top=5):
+    lines = [f"{'module':<20} {'import ms':>10} {'RSS MB':>8} {'+RSS MB':>8}  heaviest packages (self ms)"]
+    for report in result["modules"]:
+        if "error" in report:
+            lines.append(f"{report['module']:<20} failed: {report['error']}")
+            continue
+        heaviest = ", ".join(f"{name} {ms:.0f}" for name, ms in list(report["packages_ms"].items())[:top])
+        lines.append(
+            f"{report['module']:<20} {report['import_ms']:>10.1f} {report['rss_mb']:>8.1f} "
+            f"{report['rss_delta_mb']:>8.1f}  {heaviest}"
+        )
+    lines.append(f"(interpreter baseline: {result['baseline']['rss_mb']:.1f} MB RSS)")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=DEFAULT_TARGETS)
+    parser.add_argument("--json", action="store_true", help="print the raw report as JSON")
+    parser.add_argument("--top", type=int, default=5, help="packages to list per module")
+    args = parser.parse_args(argv)
+
+    result = profile(args.modules)
+    print(json.dumps(result, indent=2) if args.json else format_report(result, top=args.top))
+
+
+if __name__ == "__main__":
+    main()
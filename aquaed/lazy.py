@@ -0,0 +1,18 @@
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """Return ``name`` as a module whose code only runs on first attribute
+    access. Already-imported modules are returned as is."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
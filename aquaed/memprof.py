@@ -0,0 +1,317 @@
+"""Opt-in memory and leak profiling for long-running servers.
+
+Enable with ``AQUAED_MEMPROFILE=1``. ``tracemalloc`` then traces every
+allocation, and each Streamlit rerun takes a snapshot. A snapshot is compared
+with the previous one, so the growth between two reruns is charged to the
+session whose rerun ran first (exact with one active session, approximate
+under concurrent load). Every rerun also samples RSS, traced memory, open file
+descriptors and the size of the session artifact dir. ``AQUAED_MEMPROFILE_EVERY=N``
+limits all of this to every Nth rerun. The admin view shows the top
+allocation sites since start-up and per session. ``dump()`` writes a JSON
+report plus the raw snapshot, which can be compared offline:
+
+    python -m aquaed.memprof compare before.tracemalloc after.tracemalloc
+
+Tracing slows allocation-heavy code noticeably; leave it off in normal
+operation.
+"""
+import argparse
+import gc
+import json
+import linecache
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict, deque
+
+from aquaed import sessions
+
+ENABLED = os.environ.get("AQUAED_MEMPROFILE", "0") == "1"
+FRAMES = int(os.environ.get("AQUAED_MEMPROFILE_FRAMES", "10"))
+# Snapshot and sample on every Nth rerun only, to bound the overhead
+SNAPSHOT_EVERY = int(os.environ.get("AQUAED_MEMPROFILE_EVERY", "1"))
+# None means memprof/ in the private data dir (see dump_dir)
+DUMP_DIR = os.environ.get("AQUAED_MEMPROFILE_DIR")
+MAX_SAMPLES = 720
+MAX_SESSIONS = 200
+TOP_SITES = 25
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Allocation sites that are profiler or import machinery noise. They're
+# skipped when reading results: Snapshot.filter_traces over every trace costs
+# a minute on a large heap, against under a second for the snapshot itself
+IGNORED = {
+    tracemalloc.__file__,
+    linecache.__file__,
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+    "<unknown>",
+    __file__,
+}
+
+_lock = threading.Lock()
+_state = {"baseline": None, "last": None, "last_session": None, "reruns": 0}
+_samples = deque(maxlen=MAX_SAMPLES)
+_sessions = OrderedDict()  # session_id -> {"reruns", "growth_bytes", "sites": Counter}
+
+
+def start():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(FRAMES)
+
+
+def take_snapshot():
+    return tracemalloc.take_snapshot()
+
+
+def relevant(stats):
+    return (stat for stat in stats if stat.traceback[0].filename not in IGNORED)
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Peak rather than current RSS; ru_maxrss is KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def open_files():
+    """``{category: count}`` for this process's file descriptors."""
+    counts = Counter()
+    temp_root = tempfile.gettempdir()
+    try:
+        fds = os.listdir("/proc/self/fd")
+    except OSError:
+        return {}
+    for fd in fds:
+        try:
+            target = os.readlink(f"/proc/self/fd/{fd}")
+        except OSError:
+            continue
+        if target.startswith(sessions.ARTIFACT_ROOT):
+            counts["session artifacts"] += 1
+        elif target.startswith(temp_root):
+            counts["temp files"] += 1
+        elif target.startswith(("socket:", "pipe:", "anon_inode:")):
+            counts[target.split(":")[0]] += 1
+        else:
+            counts["other"] += 1
+    return dict(counts)
+
+
+def dir_usage(path):
+    files = total = 0
+    for root, _, names in os.walk(path, onerror=lambda e: None):
+        for name in names:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+                files += 1
+            except OSError:
+                pass
+    return files, total
+
+
+def sample():
+    traced, peak = tracemalloc.get_traced_memory()
+    # Only this app's temp files; walking the whole system temp dir is slow on a busy host
+    artifact_files, artifact_bytes = dir_usage(sessions.ARTIFACT_ROOT)
+    fds = open_files()
+    return {
+        "at": time.time(),
+        "rss": rss_bytes(),
+        "traced": traced,
+        "traced_peak": peak,
+        "open_files": sum(fds.values()),
+        "open_files_by_kind": fds,
+        "artifact_files": artifact_files,
+        "artifact_bytes": artifact_bytes,
+    }
+
+
+def site_label(stat):
+    frame = stat.traceback[0]
+    filename = os.path.relpath(frame.filename, APP_ROOT) if frame.filename.startswith(APP_ROOT) else frame.filename
+    return f"{filename}:{frame.lineno}"
+
+
+def app_frame(traceback):
+    """Innermost frame of the trace that is in this repo's code, if any; ties
+    growth inside pandas or httpx back to the line in main_page.py or aquaed
+    that caused it. The profiler's own allocations are left out."""
+    for frame in reversed(traceback):
+        if frame.filename == __file__:
+            return None
+        if frame.filename.startswith(APP_ROOT):
+            return frame
+    return None
+
+
+def _charge(session_id, diffs):
+    record = _sessions.pop(session_id, None) or {"reruns": 0, "growth_bytes": 0, "sites": Counter()}
+    record["reruns"] += 1
+    for stat in relevant(diffs):
+        if stat.size_diff <= 0:
+            continue
+        record["growth_bytes"] += stat.size_diff
+        record["sites"][site_label(stat)] += stat.size_diff
+    _sessions[session_id] = record
+    while len(_sessions) > MAX_SESSIONS:
+        _sessions.popitem(last=False)
+
+
+def track_rerun(session_id=None):
+    """Call at the top of every rerun. No-op unless profiling is enabled."""
+    if not ENABLED:
+        return
+    start()
+    session_id = session_id or sessions.current_session_id()
+    with _lock:
+        _state["reruns"] += 1
+        due = _state["reruns"] % SNAPSHOT_EVERY == 0
+        if due:
+            snapshot = take_snapshot()
+            if _state["baseline"] is None:
+                _state["baseline"] = snapshot
+            elif _state["last"] is not None:
+                _charge(_state["last_session"], snapshot.compare_to(_state["last"], "lineno"))
+            _state.update(last=snapshot, last_session=session_id)
+    if due:
+        # Sampled outside the lock: the directory walk shouldn't hold up other reruns
+        current = sample()
+        with _lock:
+            _samples.append(current)
+
+
+def top_sites(limit=TOP_SITES, app_only=False):
+    """Largest allocation growth since the first snapshot, by line. With
+    ``app_only`` each allocation is attributed to the innermost frame in
+    this repo's code instead of where it was actually allocated."""
+    with _lock:
+        baseline, last = _state["baseline"], _state["last"]
+    if baseline is None or last is None:
+        return []
+    if not app_only:
+        return [
+            {"site": site_label(stat), "growth_bytes": stat.size_diff, "size_bytes": stat.size, "count_diff": stat.count_diff}
+            for stat in list(relevant(last.compare_to(baseline, "lineno")))[:limit]
+        ]
+    growth = Counter()
+    counts = Counter()
+    for stat in last.compare_to(baseline, "traceback"):
+        frame = app_frame(stat.traceback)
+        if frame is not None and stat.size_diff:
+            label = f"{os.path.relpath(frame.filename, APP_ROOT)}:{frame.lineno}"
+            growth[label] += stat.size_diff
+            counts[label] += stat.count_diff
+    return [
+        {"site": site, "growth_bytes": size, "count_diff": counts[site]}
+        for site, size in growth.most_common(limit)
+    ]
+
+
+def session_growth(limit=20):
+    with _lock:
+        records = list(_sessions.items())
+    records.sort(key=lambda item: -item[1]["growth_bytes"])
+    return [
+        {
+            "session_id": session_id,
+            "reruns": record["reruns"],
+            "growth_bytes": record["growth_bytes"],
+            "top_sites": record["sites"].most_common(5),
+        }
+        for session_id, record in records[:limit]
+    ]
+
+
+def samples():
+    with _lock:
+        return list(_samples)
+
+
+# Suspects for slow leaks; counting them walks the whole heap, so it only
+# happens on request
+WATCHED_TYPES = {
+    "openai.OpenAI": ("openai", "OpenAI"),
+    "openai.AsyncOpenAI": ("openai", "AsyncOpenAI"),
+    "httpx.Client": ("httpx", "Client"),
+    "pandas.DataFrame": ("pandas", "DataFrame"),
+    "tempfile._TemporaryFileWrapper": ("tempfile", "_TemporaryFileWrapper"),
+}
+
+
+def live_objects():
+    labels = {}
+    for label, (module, name) in WATCHED_TYPES.items():
+        cls = getattr(sys.modules.get(module), name, None)
+        if cls is not None:
+            labels[cls] = label
+    # Exact type matches: one dict lookup per object keeps the heap walk fast
+    counts = Counter(labels[type(obj)] for obj in gc.get_objects() if type(obj) in labels)
+    return {label: counts[label] for label in labels.values()}
+
+
+def dump_dir():
+    if DUMP_DIR is not None:
+        return DUMP_DIR
+    from aquaed.core import data_dir
+    return os.path.join(data_dir(), "memprof")
+
+
+def dump(directory=None):
+    """Write a JSON report and the latest raw snapshot; returns the report path.
+    Both hold source lines and session IDs, so they're private to this user."""
+    directory = directory or dump_dir()
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    with _lock:
+        last = _state["last"]
+    report = {
+        "pid": os.getpid(),
+        "at": time.time(),
+        "reruns": _state["reruns"],
+        "samples": samples(),
+        "top_sites": top_sites(),
+        "top_app_sites": top_sites(app_only=True),
+        "sessions": session_growth(MAX_SESSIONS),
+        "live_objects": live_objects(),
+    }
+    if last is not None:
+        report["snapshot"] = os.path.join(directory, f"snapshot-{os.getpid()}-{stamp}.tracemalloc")
+        last.dump(report["snapshot"])
+        os.chmod(report["snapshot"], 0o600)
+    path = os.path.join(directory, f"report-{os.getpid()}-{stamp}.json")
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+        json.dump(report, f, indent=1, default=str)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect tracemalloc snapshots written by aquaed.memprof.dump().")
+    sub = parser.add_subparsers(dest="command", required=True)
+    top = sub.add_parser("top", help="largest allocation sites in one snapshot")
+    top.add_argument("snapshot")
+    compare = sub.add_parser("compare", help="growth between two snapshots")
+    compare.add_argument("before")
+    compare.add_argument("after")
+    for p in (top, compare):
+        p.add_argument("--limit", type=int, default=TOP_SITES)
+        p.add_argument("--group-by", choices=["lineno", "filename", "traceback"], default="lineno")
+    args = parser.parse_args(argv)
+
+    if args.command == "top":
+        stats = tracemalloc.Snapshot.load(args.snapshot).statistics(args.group_by)
+    else:
+        stats = tracemalloc.Snapshot.load(args.after).compare_to(tracemalloc.Snapshot.load(args.before), args.group_by)
+    for stat in stats[:args.limit]:
+        print(stat)
+
+
+if __name__ == "__main__":
+    main()
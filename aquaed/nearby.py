@@ -0,0 +1,212 @@
+"""Nearest-ZIP lookups over ZIP code centroids.
+
+Centroids come from ``zip_centroids.csv`` (``ZIP Code``, ``Latitude``,
+``Longitude``), joined with the current water data. Each centroid is stored
+as a unit vector on the sphere, so one matrix-vector product ranks every ZIP
+by great-circle distance from a point; the dot product is only turned into
+kilometres (haversine-equivalent) for the rows returned. For the few thousand
+ZIP codes in California that is faster than walking a tree.
+
+Build the centroid file from the Census ZCTA gazetteer, or by geocoding every
+ZIP in the water data with the Google Maps key:
+
+    python -m aquaed.nearby build --gazetteer 2023_Gaz_zcta_national.txt
+    python -m aquaed.nearby build
+"""
+import argparse
+import os
+import threading
+
+from aquaed import core
+from aquaed.lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+requests = lazy_import("requests")
+
+CENTROIDS_PATH = os.environ.get("AQUAED_ZIP_CENTROIDS", os.path.join(core.BASE_DIR, "zip_centroids.csv"))
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_K = 5
+DEFAULT_RADIUS_KM = 15.0
+
+
+def unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+class NearbyIndex:
+    def __init__(self, df, centroids):
+        # First row per ZIP, as core.lookup_zip reports it
+        zips = df.drop_duplicates("ZIP Code").merge(centroids, on="ZIP Code")
+        self.zips = zips["ZIP Code"].to_numpy(dtype=np.int64)
+        self.cities = zips["City"].tolist()
+        self.scores = zips["Water Quality Score"].to_numpy(dtype=np.int64)
+        self.meets_epa = (zips["Meets EPA Standards"] == "Yes").to_numpy()
+        self.lat = zips["Latitude"].to_numpy(dtype=np.float64)
+        self.lon = zips["Longitude"].to_numpy(dtype=np.float64)
+        self.vectors = unit_vectors(self.lat, self.lon)
+        self.rows = {int(z): row for row, z in enumerate(self.zips)}
+
+    def __len__(self):
+        return len(self.zips)
+
+    def centroid(self, zip_code):
+        row = self.rows.get(int(zip_code))
+        return None if row is None else (float(self.lat[row]), float(self.lon[row]))
+
+    def _cosines(self, lat, lon):
+        return self.vectors @ unit_vectors(lat, lon)[0]
+
+    @staticmethod
+    def _km(cosines):
+        return EARTH_RADIUS_KM * np.arccos(np.clip(cosines, -1.0, 1.0))
+
+    def _record(self, row, cosine):
+        return {
+            "zip_code": int(self.zips[row]),
+            "city": self.cities[row],
+            "score": int(self.scores[row]),
+            "meets_epa": bool(self.meets_epa[row]),
+            "distance_km": round(float(self._km(cosine)), 2),
+        }
+
+    def nearest(self, lat, lon, k=DEFAULT_K, exclude=None):
+        """The ``k`` ZIPs closest to a point, nearest first."""
+        cosines = self._cosines(lat, lon)
+        excluded = exclude is not None and int(exclude) in self.rows
+        if excluded:
+            cosines[self.rows[int(exclude)]] = -2.0
+        k = min(k, len(cosines) - excluded)
+        if k <= 0:
+            return []
+        # Largest cosine = smallest distance; only the top k are sorted
+        top = np.argpartition(-cosines, k - 1)[:k]
+        top = top[np.argsort(-cosines[top])]
+        return [self._record(row, cosines[row]) for row in top]
+
+    def nearest_where(self, lat, lon, mask, radius_km=DEFAULT_RADIUS_KM):
+        """The closest ZIP within ``radius_km`` whose row is set in ``mask``."""
+        cosines = np.where(mask, self._cosines(lat, lon), -2.0)
+        row = int(np.argmax(cosines))
+        if not mask[row] or cosines[row] < np.cos(radius_km / EARTH_RADIUS_KM):
+            return None
+        return self._record(row, cosines[row])
+
+    def compare(self, zip_code, lat=None, lon=None, k=DEFAULT_K, radius_km=DEFAULT_RADIUS_KM):
+        """Neighbours of ``zip_code`` measured from the clicked point (or the
+        ZIP's centroid): the ``k`` nearest, the nearest that meets EPA
+        standards and the nearest with a higher score within ``radius_km``."""
+        zip_code = int(zip_code)
+        if lat is None or lon is None:
+            origin = self.centroid(zip_code)
+            if origin is None:
+                return None
+            lat, lon = origin
+        others = self.zips != zip_code
+        row = self.rows.get(zip_code)
+        if row is not None:
+            score = int(self.scores[row])
+        else:
+            # A ZIP with water data but no centroid still gets compared by score
+            info = core.lookup_zip(zip_code)
+            score = info["score"] if info else None
+        return {
+            "zip_code": zip_code,
+            "nearest": self.nearest(lat, lon, k, exclude=zip_code),
+            "nearest_meeting_epa": self.nearest_where(lat, lon, others & self.meets_epa, radius_km),
+            "nearest_higher_score": (
+                self.nearest_where(lat, lon, others & (self.scores > score), radius_km) if score is not None else None
+            ),
+            "radius_km": radius_km,
+        }
+
+
+def load_centroids(path=CENTROIDS_PATH):
+    centroids = pd.read_csv(path, dtype={"ZIP Code": int, "Latitude": float, "Longitude": float})
+    return centroids[["ZIP Code", "Latitude", "Longitude"]].drop_duplicates("ZIP Code")
+
+
+_lock = threading.Lock()
+_index = {}
+
+
+def get_index():
+    """Index for the current water data and centroid file, or None if no
+    centroid file has been built."""
+    try:
+        mtime = os.stat(CENTROIDS_PATH).st_mtime_ns
+    except OSError:
+        return None
+    df = core.load_water_data()
+    with _lock:
+        if _index.get("source") is not df or _index.get("mtime") != mtime:
+            _index.update(source=df, mtime=mtime, index=NearbyIndex(df, load_centroids(CENTROIDS_PATH)))
+        return _index["index"]
+
+
+def compare(zip_code, lat=None, lon=None, k=DEFAULT_K, radius_km=DEFAULT_RADIUS_KM):
+    index = get_index()
+    return None if index is None else index.compare(zip_code, lat, lon, k, radius_km)
+
+
+# --- Building the centroid file ---
+def from_gazetteer(path, zips):
+    gazetteer = pd.read_csv(path, sep="\t", dtype={"GEOID": int})
+    gazetteer.columns = [c.strip() for c in gazetteer.columns]
+    gazetteer = gazetteer[gazetteer["GEOID"].isin(zips)]
+    return pd.DataFrame({"ZIP Code": gazetteer["GEOID"], "Latitude": gazetteer["INTPTLAT"], "Longitude": gazetteer["INTPTLONG"]})
+
+
+def geocode_zip(zip_code):
+    response = requests.get(
+        "https://maps.googleapis.com/maps/api/geocode/json",
+        params={"components": f"postal_code:{zip_code}|country:US", "key": core.get_secret("GOOGLEMAPS_API_KEY")},
+        timeout=10,
+    ).json()
+    if response["status"] != "OK":
+        return None
+    location = response["results"][0]["geometry"]["location"]
+    return location["lat"], location["lng"]
+
+
+def from_geocoder(zips):
+    rows = []
+    for zip_code in zips:
+        location = geocode_zip(zip_code)
+        if location is None:
+            print(f"No centroid for {zip_code}")
+        else:
+            rows.append((zip_code, *location))
+    return pd.DataFrame(rows, columns=["ZIP Code", "Latitude", "Longitude"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the ZIP centroid index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="write the centroid file for every ZIP in the water data")
+    build.add_argument("--gazetteer", help="Census ZCTA gazetteer file; geocodes with Google Maps if omitted")
+    build.add_argument("--output", default=CENTROIDS_PATH)
+    near = sub.add_parser("compare", help="print the neighbours of a ZIP")
+    near.add_argument("zip_code", type=int)
+    near.add_argument("-k", type=int, default=DEFAULT_K)
+    near.add_argument("--radius-km", type=float, default=DEFAULT_RADIUS_KM)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        zips = sorted(int(z) for z in core.load_water_data()["ZIP Code"].unique())
+        centroids = from_gazetteer(args.gazetteer, zips) if args.gazetteer else from_geocoder(zips)
+        tmp = f"{args.output}.tmp"
+        centroids.sort_values("ZIP Code").to_csv(tmp, index=False)
+        os.replace(tmp, args.output)
+        print(f"Wrote {len(centroids)} of {len(zips)} centroids to {args.output}")
+    else:
+        result = compare(args.zip_code, k=args.k, radius_km=args.radius_km)
+        if result is None:
+            parser.exit(1, f"No centroid for {args.zip_code} (run `python -m aquaed.nearby build` first)\n")
+        for key in ("nearest", "nearest_meeting_epa", "nearest_higher_score"):
+            print(f"{key}: {result[key]}")
+
+
+if __name__ == "__main__":
+    main()
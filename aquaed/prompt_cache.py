@@ -0,0 +1,194 @@
+"""Near-duplicate caching for free-text prompts.
+
+City names are canonicalized against the cities in ``bayareawater.csv``
+("san jose ", "San José, CA" and "San Jos" all become "San Jose"). Other free
+text, such as the AquaEdvisor issue description, is matched with MinHash/LSH
+so trivially different wordings share one cached answer.
+"""
+import difflib
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+
+from aquaed.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+STATE_SUFFIXES = {"ca", "calif", "california", "usa", "us"}
+# Tolerates a dropped or swapped letter ("San Jos") without folding
+# "Santa Clarita" into "Santa Clara"
+CITY_MATCH_CUTOFF = 0.92
+
+# 2**31 - 1, so (a * h + b) stays within uint64 for 31-bit hashes
+MERSENNE_PRIME = (1 << 31) - 1
+SHINGLE_SIZE = 4
+
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w]+", " ", text.casefold())
+    return " ".join(text.split())
+
+
+@lru_cache(maxsize=None)
+def _city_names():
+    from aquaed.core import load_water_data
+    return {normalize_text(city): city for city in load_water_data()["City"].unique()}
+
+
+def reset_cities():
+    """Forget the city list after the dataset's set of cities changes."""
+    _city_names.cache_clear()
+
+
+def canonical_city(text):
+    """Return the dataset's spelling of the city in ``text``, or None."""
+    words = normalize_text(text).split()
+    while words and words[-1] in STATE_SUFFIXES:
+        words.pop()
+    name = " ".join(words)
+    cities = _city_names()
+    if name in cities:
+        return cities[name]
+    match = difflib.get_close_matches(name, cities, n=1, cutoff=CITY_MATCH_CUTOFF)
+    return cities[match[0]] if match else None
+
+
+def shingles(normalized):
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+@lru_cache(maxsize=None)
+def _permutations(num_perm):
+    rng = np.random.default_rng(20240501)
+    a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash(normalized, num_perm=64):
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "little") & MERSENNE_PRIME
+         for s in shingles(normalized)],
+        dtype=np.uint64
+    )
+    a, b = _permutations(num_perm)
+    return ((a[:, None] * hashes[None, :] + b[:, None]) % MERSENNE_PRIME).min(axis=1)
+
+
+class NearDuplicateCache:
+    """LRU cache keyed by an exact ``key`` plus a free-text part matched by
+    estimated Jaccard similarity of character shingles.
+
+    With 16 bands of 4 rows, pairs above ~0.5 similarity become candidates;
+    a candidate is a hit only if its estimate reaches ``threshold``.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=64, bands=16, max_entries=2048, ttl=24 * 3600):
+        assert num_perm % bands == 0
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()        # entry_id -> (key, normalized, signature, value, expires)
+        self._exact = {}                     # (key, normalized) -> entry_id
+        self._buckets = defaultdict(set)     # (key, band, band_hash) -> entry_ids
+        self._next_id = 0
+
+    def _band_keys(self, key, signature):
+        return [(key, band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def _remove(self, entry_id):
+        key, normalized, signature, _, _ = self._entries.pop(entry_id)
+        self._exact.pop((key, normalized), None)
+        if signature is not None:
+            for band_key in self._band_keys(key, signature):
+                self._buckets[band_key].discard(entry_id)
+                if not self._buckets[band_key]:
+                    del self._buckets[band_key]
+
+    def _live(self, entry_id, now):
+        entry = self._entries.get(entry_id)
+        if entry is None:
+            return None
+        if entry[4] < now:
+            self._remove(entry_id)
+            return None
+        self._entries.move_to_end(entry_id)
+        return entry
+
+    def get(self, key, text):
+        normalized = normalize_text(text)
+        now = time.time()
+        with self._lock:
+            entry_id = self._exact.get((key, normalized))
+            if entry_id is not None and self._live(entry_id, now):
+                self.hits += 1
+                return self._entries[entry_id][3]
+        if not normalized:
+            self.misses += 1
+            return None
+
+        signature = minhash(normalized, self.num_perm)
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(key, signature):
+                candidates |= self._buckets.get(band_key, set())
+            best, best_score = None, self.threshold
+            for entry_id in candidates:
+                entry = self._live(entry_id, now)
+                if entry is None:
+                    continue
+                score = float((entry[2] == signature).mean())
+                if score >= best_score:
+                    best, best_score = entry_id, score
+            if best is not None:
+                self.hits += 1
+                return self._entries[best][3]
+            self.misses += 1
+            return None
+
+    def put(self, key, text, value):
+        normalized = normalize_text(text)
+        signature = minhash(normalized, self.num_perm) if normalized else None
+        with self._lock:
+            existing = self._exact.get((key, normalized))
+            if existing is not None:
+                self._remove(existing)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (key, normalized, signature, value, time.time() + self.ttl)
+            self._exact[(key, normalized)] = entry_id
+            if signature is not None:
+                for band_key in self._band_keys(key, signature):
+                    self._buckets[band_key].add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, predicate):
+        """Drop every entry whose key satisfies ``predicate``; returns how many."""
+        with self._lock:
+            doomed = [entry_id for entry_id, entry in self._entries.items() if predicate(entry[0])]
+            for entry_id in doomed:
+                self._remove(entry_id)
+            return len(doomed)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+fun_facts = NearDuplicateCache()
+recommendations = NearDuplicateCache()
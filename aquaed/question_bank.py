@@ -0,0 +1,213 @@
+"""Indexed quiz question store.
+
+Questions are kept in SQLite, ordered so every (language, topic, difficulty)
+stratum occupies a contiguous id range. Sampling ``k`` questions only draws
+``k`` random offsets into those ranges and fetches the matching rows; the
+bank itself is never materialized or shuffled per session.
+
+The bank is loaded once per process. By default it is built in memory from
+``questions.json``; for larger banks build a file once and point
+``AQUAED_QUESTION_DB`` at it::
+
+    python -m aquaed.question_bank build question_bank.sqlite questions.json more_questions.json
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from aquaed.core import QUESTIONS_PATH
+
+DEFAULT_LANGUAGE = "English"
+DEFAULT_TOPIC = "general"
+DEFAULT_DIFFICULTY = "medium"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    language TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    question TEXT NOT NULL,
+    options TEXT NOT NULL,
+    answer TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS questions_text ON questions (question);
+CREATE TABLE IF NOT EXISTS strata (
+    language TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    first_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (language, topic, difficulty)
+);
+"""
+
+
+def read_sources(paths):
+    questions = []
+    for path in paths:
+        with open(path, "r") as f:
+            for q in json.load(f):
+                if q["answer"] not in q["options"]:
+                    raise ValueError(f"{path}: answer not among options for {q['question']!r}")
+                questions.append(q)
+    return questions
+
+
+def build(conn, questions):
+    """Write ``questions`` into an empty database, grouped by stratum."""
+    conn.executescript(SCHEMA)
+    strata = defaultdict(list)
+    for q in questions:
+        key = (q.get("language", DEFAULT_LANGUAGE), q.get("topic", DEFAULT_TOPIC), q.get("difficulty", DEFAULT_DIFFICULTY))
+        strata[key].append(q)
+
+    next_id = 1
+    with conn:
+        for (language, topic, difficulty), items in sorted(strata.items()):
+            conn.executemany(
+                "INSERT INTO questions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (next_id + i, language, topic, difficulty, q["question"], json.dumps(q["options"]), q["answer"])
+                    for i, q in enumerate(items)
+                ]
+            )
+            conn.execute("INSERT INTO strata VALUES (?, ?, ?, ?, ?)", (language, topic, difficulty, next_id, len(items)))
+            next_id += len(items)
+
+
+class QuestionBank:
+    def __init__(self, conn):
+        self._conn = conn
+        # sqlite3 connections aren't safe to share between Streamlit's script threads
+        self._lock = threading.Lock()
+        self._strata = [
+            {"language": row[0], "topic": row[1], "difficulty": row[2], "first_id": row[3], "count": row[4]}
+            for row in conn.execute("SELECT language, topic, difficulty, first_id, count FROM strata ORDER BY first_id")
+        ]
+
+    @classmethod
+    def from_json(cls, *paths):
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        build(conn, read_sources(paths))
+        return cls(conn)
+
+    @classmethod
+    def from_file(cls, path):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        return cls(conn)
+
+    def __len__(self):
+        return sum(s["count"] for s in self._strata)
+
+    def languages(self):
+        return sorted({s["language"] for s in self._strata})
+
+    def topics(self, language=DEFAULT_LANGUAGE):
+        return sorted({s["topic"] for s in self._strata if s["language"] == language})
+
+    def _rows(self, where, params):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, language, topic, difficulty, question, options, answer FROM questions WHERE {where}", params
+            ).fetchall()
+        return [
+            {
+                "id": row[0], "language": row[1], "topic": row[2], "difficulty": row[3],
+                "question": row[4], "options": json.loads(row[5]), "answer": row[6],
+            }
+            for row in rows
+        ]
+
+    def get(self, ids):
+        by_id = {q["id"]: q for q in self._rows(f"id IN ({','.join('?' * len(ids))})", list(ids))}
+        return [by_id[i] for i in ids if i in by_id]
+
+    def find(self, question_text, language=None):
+        if language is None:
+            rows = self._rows("question = ? LIMIT 1", (question_text,))
+        else:
+            rows = self._rows("question = ? AND language = ? LIMIT 1", (question_text, language))
+        return rows[0] if rows else None
+
+    def sample(self, k, language=DEFAULT_LANGUAGE, topics=None, difficulty=None, rng=random):
+        """Draw up to ``k`` distinct questions spread as evenly as possible
+        across topics. Falls back to English when ``language`` has none."""
+        strata = [
+            s for s in self._strata
+            if s["language"] == language
+            and (topics is None or s["topic"] in topics)
+            and (difficulty is None or s["difficulty"] == difficulty)
+        ]
+        if not strata and language != DEFAULT_LANGUAGE:
+            return self.sample(k, DEFAULT_LANGUAGE, topics, difficulty, rng)
+
+        by_topic = defaultdict(list)
+        for s in strata:
+            by_topic[s["topic"]].append(s)
+        sizes = {topic: sum(s["count"] for s in ranges) for topic, ranges in by_topic.items()}
+
+        # Round-robin over topics in random order until k is reached or topics run dry
+        allocation = dict.fromkeys(sizes, 0)
+        order = list(sizes)
+        rng.shuffle(order)
+        remaining = min(k, sum(sizes.values()))
+        while remaining:
+            for topic in order:
+                if remaining and allocation[topic] < sizes[topic]:
+                    allocation[topic] += 1
+                    remaining -= 1
+
+        ids = []
+        for topic, n in allocation.items():
+            if n:
+                ids.extend(self._offsets_to_ids(by_topic[topic], rng.sample(range(sizes[topic]), n)))
+        rng.shuffle(ids)
+        return self.get(ids)
+
+    @staticmethod
+    def _offsets_to_ids(ranges, offsets):
+        ids = []
+        for offset in offsets:
+            for s in ranges:
+                if offset < s["count"]:
+                    ids.append(s["first_id"] + offset)
+                    break
+                offset -= s["count"]
+        return ids
+
+
+@lru_cache(maxsize=None)
+def get_question_bank():
+    path = os.environ.get("AQUAED_QUESTION_DB")
+    if path:
+        return QuestionBank.from_file(path)
+    return QuestionBank.from_json(QUESTIONS_PATH)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a SQLite question bank from JSON question files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build")
+    build_parser.add_argument("db_path")
+    build_parser.add_argument("sources", nargs="+")
+    args = parser.parse_args(argv)
+
+    questions = read_sources(args.sources)
+    tmp_path = args.db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    build(conn, questions)
+    conn.close()
+    os.replace(tmp_path, args.db_path)
+    print(f"Wrote {len(questions)} questions to {args.db_path}")
+
+
+if __name__ == "__main__":
+    main()
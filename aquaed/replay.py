@@ -0,0 +1,524 @@
+"""Record real sessions and replay them offline against ``main_page.py``.
+
+Recording (``AQUAED_TRACE_MODE=record``) appends JSON lines to
+``AQUAED_TRACE_PATH`` (default ``aquaed-trace.jsonl`` in ``core.DATA_DIR``),
+created readable by the current user only:
+
+* one ``rerun`` event per Streamlit rerun, holding the browser's widget
+  states exactly as Streamlit received them;
+* one ``upstream`` event per OpenAI request (captured at the HTTP transport,
+  so chat completions and TTS alike) and per reverse geocode, holding the
+  request, the response and its latency. These often run on worker threads,
+  so they are matched to reruns by request content rather than by session.
+* one ``upstream`` event with ``"cached": true`` for every completion,
+  speech clip or geocode answered from the shared cache or the prompt cache,
+  holding the request replay will send for it. Replay starts with cold
+  caches, so without these a warm server's trace would replay as misses.
+  Their latency is filled in from the recorded upstream calls of the same
+  kind.
+
+Traces are anonymized as they are written. Session IDs are replaced with
+salted hashes, and API keys and auth headers are never stored. Email
+addresses and phone numbers in widget values, prompts and responses are
+redacted. Coordinates are rounded to about 100 m. The same redaction is
+applied when a replayed request is matched against the trace, so matching is
+unaffected.
+
+Replay re-drives the app with Streamlit's AppTest, serving the recorded
+responses instead of calling upstream:
+
+    python -m aquaed.replay trace.jsonl --speedup 10
+
+The report gives per-rerun latency and how many upstream calls were made,
+served from the trace, or missing from it. Replay against a changed build to
+measure what caching or execution changes do to real traffic. Widget states
+are matched by Streamlit's widget IDs, so widgets whose label or key changed
+since recording keep their default values.
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import secrets
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from aquaed.lazy import lazy_import
+
+httpx = lazy_import("httpx")
+
+MODE = os.environ.get("AQUAED_TRACE_MODE", "off")  # off | record | replay
+# None means aquaed-trace.jsonl in the private data dir (see trace_path)
+TRACE_PATH = os.environ.get("AQUAED_TRACE_PATH")
+# Recorded upstream latency is divided by this during replay
+UPSTREAM_SPEEDUP = float(os.environ.get("AQUAED_TRACE_UPSTREAM_SPEEDUP", "1"))
+COORDINATE_DIGITS = 3
+# Request fields that identify an OpenAI call; the model is left out because
+# routing may pick a different one on replay
+REQUEST_FIELDS = ("messages", "input", "voice")
+# Calls are keyed by endpoint rather than full path, so cache hits can be
+# recorded without knowing the client's base URL
+ENDPOINTS = ("/chat/completions", "/audio/speech")
+
+EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+# Not preceded or followed by URL characters, so IDs in product links survive
+PHONE = re.compile(r"(?<![\w/=&%-])(?:\+?1[\s.-]?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}(?![\w&%])")
+
+# Session-state keys for the per-session random source
+SEED_KEY = "_aquaed_trace_seed"
+RNG_KEY = "_aquaed_trace_rng"
+
+_salt = secrets.token_bytes(16)
+_lock = threading.Lock()
+_started = time.time()
+_counts = Counter()
+
+
+# --- Anonymization ---
+def redact(text):
+    return PHONE.sub("[phone]", EMAIL.sub("[email]", text))
+
+
+def scrub(value):
+    """Redact strings and round floats (coordinates) anywhere in ``value``."""
+    if isinstance(value, str):
+        return redact(value)
+    if isinstance(value, float):
+        return round(value, COORDINATE_DIGITS)
+    if isinstance(value, list):
+        return [scrub(v) for v in value]
+    if isinstance(value, dict):
+        return {k: scrub(v) for k, v in value.items()}
+    return value
+
+
+def anonymous_id(session_id):
+    return hmac.new(_salt, session_id.encode(), hashlib.sha256).hexdigest()[:12]
+
+
+def scrub_widget_states(states):
+    from streamlit.proto.WidgetStates_pb2 import WidgetStates
+
+    scrubbed = WidgetStates()
+    for original in states:
+        state = scrubbed.widgets.add()
+        state.CopyFrom(original)
+        field = state.WhichOneof("value")
+        if field in ("string_value", "string_trigger_value"):
+            setattr(state, field, redact(getattr(state, field)))
+        elif field == "json_value":
+            try:
+                state.json_value = json.dumps(scrub(json.loads(state.json_value)))
+            except ValueError:
+                state.json_value = redact(state.json_value)
+        elif field == "string_array_value":
+            values = [redact(v) for v in state.string_array_value.data]
+            del state.string_array_value.data[:]
+            state.string_array_value.data.extend(values)
+    return scrubbed
+
+
+# --- Trace I/O ---
+def trace_path():
+    if TRACE_PATH is not None:
+        return TRACE_PATH
+    from aquaed.core import data_dir
+    return os.path.join(data_dir(), "aquaed-trace.jsonl")
+
+
+def write_event(event):
+    line = json.dumps(event, separators=(",", ":"))
+    # Traces hold prompts and answers: created 0600, and never through a symlink
+    flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0)
+    # One write per line, appended under a lock so concurrent sessions never interleave
+    with _lock:
+        with os.fdopen(os.open(trace_path(), flags, 0o600), "a") as f:
+            f.write(line + "\n")
+
+
+def read_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _current_session():
+    from aquaed.sessions import current_session_id
+    return anonymous_id(current_session_id())
+
+
+def session_rng(session_state):
+    """Random source for choices that shape later requests, such as quiz
+    sampling. While tracing it is seeded per session and the seed is recorded,
+    so a replay makes the same choices and sends the same prompts."""
+    if MODE == "off":
+        return random
+    if RNG_KEY not in session_state:
+        session_state.setdefault(SEED_KEY, secrets.randbits(32))
+        session_state[RNG_KEY] = random.Random(session_state[SEED_KEY])
+    return session_state[RNG_KEY]
+
+
+def record_rerun(session_state):
+    """Call at the top of every rerun; records the widget states that
+    triggered it. No-op unless recording."""
+    if MODE != "record":
+        return
+    session_state.setdefault(SEED_KEY, secrets.randbits(32))
+    try:
+        from streamlit.runtime.state import get_session_state
+        states = get_session_state()._state.get_widget_states()
+    except Exception:
+        return
+    write_event({
+        "type": "rerun",
+        "session": _current_session(),
+        "t": time.time() - _started,
+        "seed": session_state[SEED_KEY],
+        "widgets": base64.b64encode(scrub_widget_states(states).SerializeToString()).decode(),
+    })
+
+
+def endpoint(path):
+    return next((e for e in ENDPOINTS if path.endswith(e)), path)
+
+
+def openai_key(method, path, body):
+    request = {k: scrub(body[k]) for k in REQUEST_FIELDS if k in body}
+    return hashlib.sha256(json.dumps([method, endpoint(path), request], sort_keys=True).encode()).hexdigest()
+
+
+def geocode_key(lat, lon):
+    return hashlib.sha256(json.dumps([round(float(lat), COORDINATE_DIGITS), round(float(lon), COORDINATE_DIGITS)]).encode()).hexdigest()
+
+
+def _request_body(request):
+    try:
+        return json.loads(request.content or b"{}")
+    except ValueError:
+        return {}
+
+
+def _encode_response(response):
+    content_type = response.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        return {"status": response.status_code, "content_type": content_type, "json": scrub(response.json())}
+    return {"status": response.status_code, "content_type": content_type, "base64": base64.b64encode(response.content).decode()}
+
+
+def _decode_response(recorded, request):
+    if "json" in recorded:
+        content = json.dumps(recorded["json"]).encode()
+    else:
+        content = base64.b64decode(recorded["base64"])
+    return httpx.Response(
+        recorded["status"], headers={"content-type": recorded["content_type"]}, content=content, request=request
+    )
+
+
+def _record_openai(request, response, latency):
+    body = _request_body(request)
+    write_event({
+        "type": "upstream",
+        "kind": "openai",
+        "t": time.time() - _started,
+        "key": openai_key(request.method, request.url.path, body),
+        "request": {"method": request.method, "path": request.url.path, "body": scrub(body)},
+        "response": _encode_response(response),
+        "latency": latency,
+    })
+
+
+# --- Cache hits ---
+def _record_cached(kind, key, request, response):
+    write_event({
+        "type": "upstream",
+        "kind": kind,
+        "t": time.time() - _started,
+        "key": key,
+        "request": request,
+        "response": response,
+        "latency": None,
+        "cached": True,
+    })
+
+
+def _record_cached_openai(path, body, response):
+    _record_cached(
+        "openai", openai_key("POST", path, body), {"method": "POST", "path": path, "body": scrub(body)}, response
+    )
+
+
+def record_cached_completion(messages, text):
+    """Record a chat completion answered from a cache as the request replay
+    will send for it. No-op unless recording."""
+    if MODE != "record":
+        return
+    completion = {
+        "id": "chatcmpl-cached",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "cached",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+    }
+    _record_cached_openai(
+        "/chat/completions", {"messages": messages},
+        {"status": 200, "content_type": "application/json", "json": scrub(completion)},
+    )
+
+
+def record_cached_speech(chunks, voice, clip):
+    """Record a cached clip as its chunk requests. The whole clip goes with
+    the first chunk and the rest are empty, so the stitched clip is the same."""
+    if MODE != "record":
+        return
+    for i, chunk in enumerate(chunks):
+        _record_cached_openai(
+            "/audio/speech", {"input": chunk, "voice": voice},
+            {"status": 200, "content_type": "audio/mpeg", "base64": base64.b64encode(clip if i == 0 else b"").decode()},
+        )
+
+
+def record_cached_geocode(lat, lon, zip_code):
+    if MODE != "record":
+        return
+    data = {"status": "OK", "results": [{"address_components": [{"short_name": zip_code, "types": ["postal_code"]}]}]}
+    _record_cached(
+        "geocode", geocode_key(lat, lon),
+        {"lat": round(float(lat), COORDINATE_DIGITS), "lon": round(float(lon), COORDINATE_DIGITS)},
+        {"status": 200, "content_type": "application/json", "json": scrub(data)},
+    )
+
+
+# --- Replay store ---
+def _latency_group(event):
+    return event["kind"], endpoint(event["request"].get("path", ""))
+
+
+class Recordings:
+    """Recorded responses by request key. Repeated identical requests get the
+    recorded responses in order, then the last one again. Cache hits are
+    charged the median latency of recorded upstream calls of the same kind."""
+
+    def __init__(self, events=()):
+        self._lock = threading.Lock()
+        self._responses = defaultdict(deque)
+        self._last = {}
+        upstream = [event for event in events if event.get("type") == "upstream"]
+        observed = defaultdict(list)
+        for event in upstream:
+            if event["latency"] is not None:
+                observed[_latency_group(event)].append(event["latency"])
+        for event in upstream:
+            latency = event["latency"]
+            if latency is None:
+                latency = percentile(observed[_latency_group(event)], 0.5) or 0.0
+            self._responses[event["key"]].append((event["response"], latency))
+
+    def take(self, key):
+        with self._lock:
+            queue = self._responses.get(key)
+            if queue:
+                self._last[key] = queue.popleft()
+            return self._last.get(key)
+
+
+_recordings = {}
+
+
+def recordings():
+    with _lock:
+        if "store" not in _recordings:
+            path = trace_path()
+            _recordings["store"] = Recordings(read_trace(path) if os.path.exists(path) else ())
+        return _recordings["store"]
+
+
+def _replay_openai(request):
+    body = _request_body(request)
+    found = recordings().take(openai_key(request.method, request.url.path, body))
+    if found is None:
+        _counts["openai_missing"] += 1
+        # Surfaces as an OpenAI error, so the app's fallbacks run as in an outage
+        return httpx.Response(503, json={"error": {"message": "not in trace"}}, request=request), 0.0
+    _counts["openai_replayed"] += 1
+    recorded, latency = found
+    return _decode_response(recorded, request), latency / UPSTREAM_SPEEDUP
+
+
+# --- HTTP transports for the OpenAI clients ---
+def wrap_transport(inner):
+    """Transport for the sync OpenAI client in the current mode."""
+    if MODE == "off":
+        return inner
+
+    class TraceTransport(httpx.BaseTransport):
+        def handle_request(self, request):
+            _counts["openai_requests"] += 1
+            if MODE == "replay":
+                response, delay = _replay_openai(request)
+                time.sleep(delay)
+                return response
+            started = time.perf_counter()
+            response = inner.handle_request(request)
+            response.read()
+            _record_openai(request, response, time.perf_counter() - started)
+            return response
+
+        def close(self):
+            inner.close()
+
+    return TraceTransport()
+
+
+def wrap_async_transport(inner):
+    if MODE == "off":
+        return inner
+
+    class AsyncTraceTransport(httpx.AsyncBaseTransport):
+        async def handle_async_request(self, request):
+            import asyncio
+            _counts["openai_requests"] += 1
+            if MODE == "replay":
+                response, delay = _replay_openai(request)
+                await asyncio.sleep(delay)
+                return response
+            started = time.perf_counter()
+            response = await inner.handle_async_request(request)
+            await response.aread()
+            _record_openai(request, response, time.perf_counter() - started)
+            return response
+
+        async def aclose(self):
+            await inner.aclose()
+
+    return AsyncTraceTransport()
+
+
+def geocode(lat, lon, fetch):
+    """Run ``fetch()`` (the geocoding request, returning its JSON) through
+    the trace: recorded in record mode, served from the trace in replay."""
+    if MODE == "off":
+        return fetch()
+    _counts["geocode_requests"] += 1
+    key = geocode_key(lat, lon)
+    if MODE == "replay":
+        found = recordings().take(key)
+        if found is None:
+            _counts["geocode_missing"] += 1
+            return {"status": "NOT_IN_TRACE", "results": []}
+        _counts["geocode_replayed"] += 1
+        recorded, latency = found
+        time.sleep(latency / UPSTREAM_SPEEDUP)
+        return recorded["json"]
+    started = time.perf_counter()
+    data = fetch()
+    write_event({
+        "type": "upstream",
+        "kind": "geocode",
+        "t": time.time() - _started,
+        "key": key,
+        "request": {"lat": round(float(lat), COORDINATE_DIGITS), "lon": round(float(lon), COORDINATE_DIGITS)},
+        "response": {"status": 200, "content_type": "application/json", "json": scrub(data)},
+        "latency": time.perf_counter() - started,
+    })
+    return data
+
+
+def counts():
+    return dict(_counts)
+
+
+# --- Replay driver ---
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else None
+
+
+def replay(events, script, speedup=10.0, timeout=120.0):
+    """Re-drive ``script`` session by session. Sessions run one after another
+    because AppTest isn't thread-safe; think time within a session is
+    divided by ``speedup``."""
+    from streamlit.proto.WidgetStates_pb2 import WidgetStates
+    from streamlit.testing.v1 import AppTest
+
+    reruns = defaultdict(list)
+    recorded = Counter()
+    for event in events:
+        if event["type"] == "rerun":
+            reruns[event["session"]].append(event)
+        else:
+            recorded[event["kind"] + ("_cached" if event.get("cached") else "")] += 1
+
+    latencies, failures = [], 0
+    started = time.perf_counter()
+    for session, session_reruns in reruns.items():
+        session_reruns.sort(key=lambda e: e["t"])
+        app = AppTest.from_file(script, default_timeout=timeout)
+        app.session_state[SEED_KEY] = session_reruns[0].get("seed", 0)
+        previous_t = None
+        for event in session_reruns:
+            if previous_t is not None:
+                time.sleep(max(0.0, event["t"] - previous_t) / speedup)
+            previous_t = event["t"]
+            states = WidgetStates()
+            states.ParseFromString(base64.b64decode(event["widgets"]))
+            rerun_started = time.perf_counter()
+            try:
+                app._run(states if states.widgets else None)
+                failures += len(app.exception)
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - rerun_started)
+
+    return {
+        "sessions": len(reruns),
+        "reruns": len(latencies),
+        "failed_reruns": failures,
+        "wall_s": round(time.perf_counter() - started, 2),
+        "rerun_p50_s": percentile(latencies, 0.5),
+        "rerun_p95_s": percentile(latencies, 0.95),
+        "rerun_total_s": round(sum(latencies), 2),
+        "recorded_upstream_calls": dict(recorded),
+        "replay_upstream": counts(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded AquaED trace against main_page.py offline.")
+    parser.add_argument("trace")
+    parser.add_argument("--script", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main_page.py"))
+    parser.add_argument("--speedup", type=float, default=10.0, help="divide recorded think time by this")
+    parser.add_argument("--upstream-speedup", type=float, default=1.0, help="divide recorded upstream latency by this")
+    parser.add_argument("--cache-url", default=None, help="AQUAED_CACHE_URL for the run (default: a fresh SQLite file)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    # The app imports aquaed.replay and reads these at import time, so set
+    # them first and drive the replay through that module, not __main__
+    os.environ.update(
+        AQUAED_TRACE_MODE="replay",
+        AQUAED_TRACE_PATH=args.trace,
+        AQUAED_TRACE_UPSTREAM_SPEEDUP=str(args.upstream_speedup),
+        AQUAED_CACHE_URL=args.cache_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "replay-cache.sqlite"),
+    )
+    os.environ.setdefault("OPENAI_API_KEY", "replay")
+    os.environ.setdefault("GOOGLEMAPS_API_KEY", "replay")
+    from aquaed import replay as module
+
+    report = module.replay(read_trace(args.trace), args.script, speedup=args.speedup, timeout=args.timeout)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            print(f"{key:>24}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""Latency budgets, hedged requests and a circuit breaker for OpenAI calls.
+
+Each call gets a total budget. If the primary model hasn't answered by its
+observed p95 latency, a hedge request goes to a faster fallback model and
+whichever succeeds first wins. When the recent error rate spikes the breaker
+opens and callers serve cached or precomputed content until a trial call
+succeeds again.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+
+# Hedge target for each primary model
+HEDGE_MODELS = {
+    "gpt-4": "gpt-3.5-turbo",
+    "gpt-4o": "gpt-4o-mini",
+    "gpt-4o-mini": "gpt-3.5-turbo",
+    "gpt-3.5-turbo": "gpt-4o-mini",
+}
+# Total seconds a call may take, hedge included
+LATENCY_BUDGETS = {
+    "gpt-4": 45.0,
+    "gpt-4o": 30.0,
+    "gpt-4o-mini": 20.0,
+    "gpt-3.5-turbo": 20.0,
+}
+DEFAULT_BUDGET = 30.0
+# Hedge deadline used until enough latencies have been observed
+DEFAULT_HEDGE_AFTER = {
+    "gpt-4": 15.0,
+    "gpt-4o": 10.0,
+    "gpt-4o-mini": 6.0,
+    "gpt-3.5-turbo": 6.0,
+}
+MIN_SAMPLES = 20
+HEDGING_ENABLED = os.environ.get("AQUAED_HEDGING", "1") != "0"
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+def is_transient(error):
+    """Timeouts, connection errors, 429 and 5xx: the failures worth hedging
+    and counting against the breaker. Anything else (a bad key, an invalid
+    request) would fail the same way on retry and is re-raised as is."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    openai = sys.modules.get("openai")  # an OpenAI error means it's already imported
+    if openai is None:
+        return False
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+class FallbackText(str):
+    """Stand-in content served instead of a model answer; callers shouldn't
+    cache it as if it were one."""
+
+
+class LatencyTracker:
+    def __init__(self, window=200):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self.window = window
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, name, q):
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def hedge_after(self, name):
+        p95 = self.percentile(name, 0.95)
+        return p95 if p95 is not None else DEFAULT_HEDGE_AFTER.get(name, DEFAULT_BUDGET / 3)
+
+    def stats(self):
+        with self._lock:
+            names = list(self._samples)
+        return {
+            name: {
+                "samples": len(self._samples[name]),
+                "p50": self.percentile(name, 0.5),
+                "p95": self.percentile(name, 0.95),
+            }
+            for name in names
+        }
+
+
+class CircuitBreaker:
+    """Opens when at least ``min_calls`` outcomes in the last ``window``
+    seconds have an error rate of ``threshold`` or more. After ``cooldown``
+    seconds one trial call is let through (half-open)."""
+
+    def __init__(self, threshold=0.5, min_calls=5, window=60.0, cooldown=30.0):
+        self.threshold = threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._outcomes = deque()
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if time.time() - self._opened_at >= self.cooldown else "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.time() - self._opened_at < self.cooldown or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record(self, ok):
+        now = time.time()
+        with self._lock:
+            if self._trial_in_flight:
+                self._trial_in_flight = False
+                self._opened_at = None if ok else now
+                self._outcomes.clear()
+                return
+            self._outcomes.append((now, ok))
+            while self._outcomes and now - self._outcomes[0][0] > self.window:
+                self._outcomes.popleft()
+            failures = sum(1 for _, success in self._outcomes if not success)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.threshold:
+                self._opened_at = now
+
+
+@lru_cache(maxsize=None)
+def get_upstream_executor():
+    # Separate from clients.get_executor: fan_out workers block on these calls,
+    # so sharing one pool could starve it
+    return ThreadPoolExecutor(max_workers=64, thread_name_prefix="aquaed-upstream")
+
+
+latencies = LatencyTracker()
+breaker = CircuitBreaker()
+
+
+def _timed(model, call):
+    def run():
+        start = time.perf_counter()
+        result = call(model)
+        latencies.record(model, time.perf_counter() - start)
+        return result
+    return run
+
+
+def hedged(call, model, budget=None):
+    """Run ``call(model)``. If it hasn't answered by the model's hedge
+    deadline, or fails with a transient error, also run ``call(hedge_model)``;
+    return the first successful result. Other errors are raised at once."""
+    budget = budget or LATENCY_BUDGETS.get(model, DEFAULT_BUDGET)
+    deadline = time.monotonic() + budget
+    executor = get_upstream_executor()
+    hedge_model = HEDGE_MODELS.get(model) if HEDGING_ENABLED else None
+
+    pending = {executor.submit(_timed(model, call))}
+    done, pending = wait(pending, timeout=min(latencies.hedge_after(model), budget))
+    error = None
+    while True:
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+            if not is_transient(error):
+                raise error
+        if hedge_model and (error is not None or not done):
+            pending.add(executor.submit(_timed(hedge_model, call)))
+            hedge_model = None
+        if not pending:
+            raise error
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            # Losers keep running in the background; their results are dropped
+            raise TimeoutError(f"{model} did not answer within {budget:g}s")
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        if not done:
+            raise TimeoutError(f"{model} did not answer within {budget:g}s")
+
+
+async def ahedged(call, model, budget=None):
+    """Async ``hedged``; ``call(model)`` returns an awaitable. Losing
+    requests are cancelled."""
+    budget = budget or LATENCY_BUDGETS.get(model, DEFAULT_BUDGET)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget
+    hedge_model = HEDGE_MODELS.get(model) if HEDGING_ENABLED else None
+
+    async def timed(name):
+        start = time.perf_counter()
+        result = await call(name)
+        latencies.record(name, time.perf_counter() - start)
+        return result
+
+    pending = {asyncio.ensure_future(timed(model))}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=min(latencies.hedge_after(model), budget))
+        error = None
+        while True:
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+                if not is_transient(error):
+                    raise error
+            if hedge_model and (error is not None or not done):
+                pending.add(asyncio.ensure_future(timed(hedge_model)))
+                hedge_model = None
+            if not pending:
+                raise error
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise TimeoutError(f"{model} did not answer within {budget:g}s")
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"{model} did not answer within {budget:g}s")
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def serve_fallback(fallback, error=None):
+    """Call ``fallback``; if it has nothing to serve either, chain the
+    upstream error that sent us here."""
+    try:
+        return fallback()
+    except CircuitOpenError as unavailable:
+        if error is None:
+            raise
+        raise unavailable from error
+
+
+def guarded(call, model, fallback=None):
+    """``hedged`` behind the circuit breaker. ``fallback`` (zero-argument,
+    returning stand-in content) is used when the breaker is open or the call
+    fails with a transient error; otherwise the error propagates."""
+    if not breaker.allow():
+        if fallback is not None:
+            return serve_fallback(fallback)
+        raise CircuitOpenError("OpenAI is temporarily unavailable, please try again shortly.")
+    try:
+        result = hedged(call, model)
+    except Exception as e:
+        if not is_transient(e):
+            # OpenAI answered, just not with a completion; that's not an outage
+            breaker.record(True)
+            raise
+        breaker.record(False)
+        if fallback is not None:
+            return serve_fallback(fallback, e)
+        raise
+    breaker.record(True)
+    return result
+
+
+async def aguarded(call, model, fallback=None):
+    # Fallbacks may read the water data or rollups, so they run in a thread
+    if not breaker.allow():
+        if fallback is not None:
+            return await asyncio.to_thread(serve_fallback, fallback)
+        raise CircuitOpenError("OpenAI is temporarily unavailable, please try again shortly.")
+    try:
+        result = await ahedged(call, model)
+    except Exception as e:
+        if not is_transient(e):
+            breaker.record(True)
+            raise
+        breaker.record(False)
+        if fallback is not None:
+            return await asyncio.to_thread(serve_fallback, fallback, e)
+        raise
+    breaker.record(True)
+    return result
@@ -0,0 +1,116 @@
+"""Latency- and cost-aware model routing per call site.
+
+``model_routes.toml`` lists, for each call site, the candidate models and a
+p95 latency SLO. The router records the latency and token usage of every
+call and picks the cheapest candidate whose observed p95 meets the SLO.
+Candidates without enough samples count as meeting it, and a small share of
+calls explores the other candidates so their numbers stay current.
+"""
+import os
+import random
+import threading
+from collections import deque
+from functools import lru_cache
+
+from aquaed.core import BASE_DIR
+
+try:
+    import tomllib
+
+    def _read_toml(path):
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+except ImportError:  # Python < 3.11; toml ships with streamlit
+    import toml
+
+    def _read_toml(path):
+        return toml.load(path)
+
+ROUTES_PATH = os.environ.get("AQUAED_MODEL_ROUTES", os.path.join(BASE_DIR, "model_routes.toml"))
+MIN_SAMPLES = 20
+WINDOW = 200
+EXPLORE_RATE = 0.05
+# Token profile (prompt, completion) for price comparisons before any usage is known
+NOMINAL_TOKENS = (500, 500)
+
+
+class Router:
+    def __init__(self, config, rng=random):
+        self.models = config.get("models", {})
+        self.sites = config.get("sites", {})
+        self.rng = rng
+        self._lock = threading.Lock()
+        self._samples = {}  # (site, model) -> deque of (latency_s, prompt_tokens, completion_tokens)
+
+    @classmethod
+    def from_file(cls, path=ROUTES_PATH):
+        return cls(_read_toml(path))
+
+    def _site(self, site):
+        return self.sites.get(site) or self.sites["default"]
+
+    def record(self, site, model, latency, prompt_tokens=0, completion_tokens=0):
+        with self._lock:
+            samples = self._samples.setdefault((site, model), deque(maxlen=WINDOW))
+            samples.append((latency, prompt_tokens, completion_tokens))
+
+    def _snapshot(self, site, model):
+        with self._lock:
+            return list(self._samples.get((site, model), ()))
+
+    def p95_ms(self, site, model):
+        samples = self._snapshot(site, model)
+        if len(samples) < MIN_SAMPLES:
+            return None
+        latencies = sorted(s[0] for s in samples)
+        return latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000
+
+    def token_profile(self, site):
+        """Mean prompt and completion tokens per call at ``site``, pooled over its candidates."""
+        samples = []
+        for model in self._site(site)["candidates"]:
+            samples.extend(self._snapshot(site, model))
+        if not samples:
+            return NOMINAL_TOKENS
+        return sum(s[1] for s in samples) / len(samples), sum(s[2] for s in samples) / len(samples)
+
+    def cost_per_call(self, site, model):
+        """USD per call at list price. Every candidate is priced on the site's
+        token profile so models are compared on the same workload."""
+        price = self.models.get(model, {})
+        prompt_tokens, completion_tokens = self.token_profile(site)
+        return (prompt_tokens * price.get("input_price", 0.0) + completion_tokens * price.get("output_price", 0.0)) / 1_000_000
+
+    def choose(self, site):
+        config = self._site(site)
+        candidates = config["candidates"]
+        if len(candidates) > 1 and self.rng.random() < EXPLORE_RATE:
+            return self.rng.choice(candidates)
+
+        slo = config["slo_p95_ms"]
+        meeting = [m for m in candidates if (self.p95_ms(site, m) or 0) <= slo]
+        if meeting:
+            return min(meeting, key=lambda m: self.cost_per_call(site, m))
+        # Nobody meets the SLO: take the fastest
+        return min(candidates, key=lambda m: self.p95_ms(site, m))
+
+    def stats(self):
+        rows = []
+        for site, config in self.sites.items():
+            for model in config["candidates"]:
+                samples = self._snapshot(site, model)
+                rows.append({
+                    "site": site,
+                    "model": model,
+                    "samples": len(samples),
+                    "p95_ms": self.p95_ms(site, model),
+                    "slo_p95_ms": config["slo_p95_ms"],
+                    "avg_tokens": round(sum(s[1] + s[2] for s in samples) / len(samples)) if samples else None,
+                    "usd_per_call": self.cost_per_call(site, model),
+                })
+        return rows
+
+
+@lru_cache(maxsize=None)
+def get_router():
+    return Router.from_file()
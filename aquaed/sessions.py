@@ -0,0 +1,181 @@
+"""Per-session memory/disk accounting and temp-artifact garbage collection.
+
+Files a session produces (PDF reports) live in a directory owned by
+that session. The directory is removed once Streamlit drops the session or it
+has been idle for ``IDLE_TIMEOUT`` seconds, whichever comes first.
+"""
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+
+ARTIFACT_ROOT = os.environ.get("AQUAED_ARTIFACT_DIR", os.path.join(tempfile.gettempdir(), "aquaed-sessions"))
+IDLE_TIMEOUT = float(os.environ.get("AQUAED_SESSION_IDLE_TIMEOUT", "3600"))
+SWEEP_INTERVAL = float(os.environ.get("AQUAED_SESSION_SWEEP_INTERVAL", "300"))
+
+# Used when running outside a Streamlit script thread (tests, the API, scripts)
+LOCAL_SESSION = "local"
+
+
+@dataclass
+class SessionRecord:
+    session_id: str
+    created: float
+    last_seen: float
+    reruns: int = 0
+    state_bytes: int = 0
+    state_keys: dict = field(default_factory=dict)
+    artifacts: set = field(default_factory=set)
+
+    def disk_bytes(self):
+        total = 0
+        for path in self.artifacts:
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+
+_lock = threading.Lock()
+_sessions = {}
+_last_sweep = 0.0
+
+
+def current_session_id():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        ctx = None
+    return ctx.session_id if ctx else LOCAL_SESSION
+
+
+def _record(session_id, now=None):
+    now = now or time.time()
+    record = _sessions.get(session_id)
+    if record is None:
+        record = _sessions[session_id] = SessionRecord(session_id, created=now, last_seen=now)
+    return record
+
+
+def session_dir(session_id=None):
+    # Artifacts hold users' reports: the root may sit in the shared temp dir,
+    # so it and every session directory are private to this user
+    from aquaed.core import private_dir
+    path = os.path.join(private_dir(ARTIFACT_ROOT), session_id or current_session_id())
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
+
+def new_artifact(suffix="", session_id=None):
+    """Create an empty file owned by the session and return its path."""
+    session_id = session_id or current_session_id()
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=session_dir(session_id))
+    os.close(fd)
+    with _lock:
+        _record(session_id).artifacts.add(path)
+    return path
+
+
+def estimate_size(value):
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+def track(session_state, session_id=None):
+    """Record a rerun for the session: refresh its idle timer and measure its
+    state. Also runs a sweep if the last one is older than SWEEP_INTERVAL."""
+    session_id = session_id or current_session_id()
+    state_keys = {str(key): estimate_size(value) for key, value in session_state.items()}
+    now = time.time()
+    with _lock:
+        record = _record(session_id, now)
+        record.last_seen = now
+        record.reruns += 1
+        record.state_keys = state_keys
+        record.state_bytes = sum(state_keys.values())
+        due = now - _last_sweep >= SWEEP_INTERVAL
+    if due:
+        sweep(now=now)
+
+
+def live_session_ids():
+    """IDs of sessions the Streamlit runtime still knows about, or None when
+    the runtime isn't available (then only idle expiry applies)."""
+    try:
+        from streamlit import runtime
+        if not runtime.exists():
+            return None
+        return {info.session.id for info in runtime.get_instance()._session_mgr.list_sessions()}
+    except Exception:
+        return None
+
+
+def end_session(session_id):
+    with _lock:
+        _sessions.pop(session_id, None)
+    shutil.rmtree(os.path.join(ARTIFACT_ROOT, session_id), ignore_errors=True)
+
+
+def sweep(now=None, live_ids=None):
+    """Reclaim sessions that have ended or gone idle, plus directories left
+    behind by earlier processes. Returns the IDs that were removed."""
+    global _last_sweep
+    now = now or time.time()
+    live_ids = live_session_ids() if live_ids is None else live_ids
+    with _lock:
+        _last_sweep = now
+        expired = [
+            session_id for session_id, record in _sessions.items()
+            if now - record.last_seen > IDLE_TIMEOUT
+            or (live_ids is not None and session_id != LOCAL_SESSION and session_id not in live_ids)
+        ]
+        known = set(_sessions) - set(expired)
+    for session_id in expired:
+        end_session(session_id)
+
+    if os.path.isdir(ARTIFACT_ROOT):
+        for name in os.listdir(ARTIFACT_ROOT):
+            path = os.path.join(ARTIFACT_ROOT, name)
+            if name in known or name in expired:
+                continue
+            try:
+                stale = now - os.path.getmtime(path) > IDLE_TIMEOUT
+            except OSError:
+                continue
+            if stale:
+                shutil.rmtree(path, ignore_errors=True)
+                expired.append(name)
+    return expired
+
+
+def session_stats():
+    now = time.time()
+    with _lock:
+        records = list(_sessions.values())
+    return [
+        {
+            "session_id": record.session_id,
+            "reruns": record.reruns,
+            "idle_s": round(now - record.last_seen),
+            "age_s": round(now - record.created),
+            "state_bytes": record.state_bytes,
+            "artifacts": len(record.artifacts),
+            "disk_bytes": record.disk_bytes(),
+            "largest_keys": sorted(record.state_keys.items(), key=lambda item: -item[1])[:5],
+        }
+        for record in records
+    ]
+
+
+def largest_sessions(n=10):
+    stats = session_stats()
+    stats.sort(key=lambda s: s["state_bytes"] + s["disk_bytes"], reverse=True)
+    return stats[:n]
@@ -0,0 +1,304 @@
+"""Cache tier shared by every server process and host.
+
+Streamlit replicas behind a load balancer each keep their own in-memory
+caches; this tier sits behind them so an answer, geocode or audio clip paid
+for by one replica is reused by all. The backend is chosen with
+``AQUAED_CACHE_URL``:
+
+* ``sqlite:///path/to/cache.sqlite`` (default: ``aquaed-cache.sqlite`` in
+  ``core.DATA_DIR``): a WAL-mode SQLite file shared by the processes on one
+  host. Files not owned by the current user are refused, so another local
+  user can't plant or poison the cache.
+* ``redis://host:6379/0``: a Redis (or compatible) server shared across hosts.
+  Needs the optional ``redis`` package.
+* ``none``: disabled.
+
+Values are bytes stored under a namespace with that namespace's TTL and size
+limits; least recently used entries are evicted per namespace. Backend errors
+count as misses, so an unavailable cache never takes the app down.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+# None means a SQLite file in the private data dir (see default_url)
+CACHE_URL = os.environ.get("AQUAED_CACHE_URL")
+
+DAY = 24 * 3600
+# Per-namespace TTL (seconds) and eviction limits
+NAMESPACES = {
+    "llm": {"ttl": 7 * DAY, "max_entries": 20_000, "max_bytes": 64 * 1024 * 1024},
+    "geocode": {"ttl": 30 * DAY, "max_entries": 50_000, "max_bytes": 16 * 1024 * 1024},
+    "tts": {"ttl": 7 * DAY, "max_entries": 2_000, "max_bytes": 512 * 1024 * 1024},
+}
+DEFAULT_LIMITS = {"ttl": DAY, "max_entries": 10_000, "max_bytes": 32 * 1024 * 1024}
+# Evict after this many writes to a namespace rather than on every write
+EVICT_EVERY = 50
+# Reads refresh an entry's LRU timestamp at most this often
+TOUCH_INTERVAL = 60.0
+
+
+def make_key(*parts):
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode()).hexdigest()
+
+
+def limits(namespace):
+    return NAMESPACES.get(namespace, DEFAULT_LIMITS)
+
+
+def default_url():
+    from aquaed.core import data_dir
+    return "sqlite:///" + os.path.join(data_dir(), "aquaed-cache.sqlite")
+
+
+def check_owner(path):
+    """Refuse a file (or its WAL companions) that another user created."""
+    if not hasattr(os, "getuid"):
+        return
+    for name in (path, path + "-wal", path + "-shm"):
+        try:
+            owner = os.stat(name).st_uid
+        except FileNotFoundError:
+            continue
+        if owner != os.getuid():
+            raise PermissionError(f"{name} is not owned by the current user")
+
+
+class NullCache:
+    name = "none"
+
+    def get(self, namespace, key):
+        return None
+
+    def set(self, namespace, key, value, ttl=None):
+        pass
+
+    def delete(self, namespace, key):
+        pass
+
+    def clear(self, namespace):
+        pass
+
+    def evict(self, namespace):
+        pass
+
+    def stats(self):
+        return {}
+
+
+class SQLiteCache:
+    """One row per entry; every write is a single transaction, so readers in
+    other processes see either the old value or the new one."""
+
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = {}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+        check_owner(path)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, size INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (namespace, key)"
+                ") WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (namespace, accessed_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, key):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, expires_at, accessed_at FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at, accessed_at = row
+        now = time.time()
+        if expires_at <= now:
+            self.delete(namespace, key)
+            return None
+        if now - accessed_at > TOUCH_INTERVAL:
+            with conn:
+                conn.execute("UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?", (now, namespace, key))
+        return value
+
+    def set(self, namespace, key, value, ttl=None):
+        now = time.time()
+        ttl = ttl or limits(namespace)["ttl"]
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, value, len(value), now + ttl, now),
+            )
+        with self._lock:
+            self._writes[namespace] = writes = self._writes.get(namespace, 0) + 1
+        if writes % EVICT_EVERY == 0:
+            self.evict(namespace)
+
+    def delete(self, namespace, key):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def clear(self, namespace):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+    def evict(self, namespace):
+        """Drop expired entries, then least recently used ones until the
+        namespace is within its limits."""
+        limit = limits(namespace)
+        with self._conn() as conn:
+            conn.execute("DELETE FROM entries WHERE namespace = ? AND expires_at <= ?", (namespace, time.time()))
+            count, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE namespace = ?", (namespace,)
+            ).fetchone()
+            if count <= limit["max_entries"] and total <= limit["max_bytes"]:
+                return
+            # Walk from the least recently used entry until enough is freed
+            excess_count, excess_bytes = count - limit["max_entries"], total - limit["max_bytes"]
+            doomed = []
+            for key, size in conn.execute(
+                "SELECT key, size FROM entries WHERE namespace = ? ORDER BY accessed_at", (namespace,)
+            ).fetchall():
+                if excess_count <= 0 and excess_bytes <= 0:
+                    break
+                doomed.append((namespace, key))
+                excess_count -= 1
+                excess_bytes -= size
+            conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", doomed)
+
+    def stats(self):
+        rows = self._conn().execute(
+            "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY namespace"
+        ).fetchall()
+        return {namespace: {"entries": count, "bytes": total} for namespace, count, total in rows}
+
+
+class RedisCache:
+    """Entries are plain keys with a Redis TTL. A sorted set per namespace
+    tracks recency so the namespace can be trimmed to ``max_entries``; byte
+    limits are left to the server's ``maxmemory`` policy."""
+
+    name = "redis"
+
+    def __init__(self, url, prefix="aquaed"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, namespace, key):
+        return f"{self.prefix}:{namespace}:{key}"
+
+    def _lru(self, namespace):
+        return f"{self.prefix}:{namespace}:__lru__"
+
+    def get(self, namespace, key):
+        value = self.client.get(self._key(namespace, key))
+        if value is None:
+            self.client.zrem(self._lru(namespace), key)
+        else:
+            self.client.zadd(self._lru(namespace), {key: time.time()})
+        return value
+
+    def set(self, namespace, key, value, ttl=None):
+        ttl = ttl or limits(namespace)["ttl"]
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(self._key(namespace, key), value, ex=int(ttl))
+            pipe.zadd(self._lru(namespace), {key: time.time()})
+            pipe.zcard(self._lru(namespace))
+            size = pipe.execute()[-1]
+        if size > limits(namespace)["max_entries"]:
+            self.evict(namespace)
+
+    def delete(self, namespace, key):
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(self._key(namespace, key))
+            pipe.zrem(self._lru(namespace), key)
+            pipe.execute()
+
+    def clear(self, namespace):
+        keys = [self._key(namespace, k.decode()) for k in self.client.zrange(self._lru(namespace), 0, -1)]
+        self.client.delete(self._lru(namespace), *keys)
+
+    def evict(self, namespace):
+        excess = self.client.zcard(self._lru(namespace)) - limits(namespace)["max_entries"]
+        if excess > 0:
+            oldest = [k.decode() for k, _ in self.client.zpopmin(self._lru(namespace), excess)]
+            self.client.delete(*(self._key(namespace, k) for k in oldest))
+
+    def stats(self):
+        return {
+            namespace: {"entries": self.client.zcard(self._lru(namespace)), "bytes": None}
+            for namespace in NAMESPACES
+        }
+
+
+def open_cache(url):
+    if url in ("", "none", "off"):
+        return NullCache()
+    if url.startswith("sqlite:///"):
+        return SQLiteCache(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCache(url)
+    raise ValueError(f"Unsupported AQUAED_CACHE_URL: {url}")
+
+
+_errors = {"count": 0, "last": None}
+
+
+@lru_cache(maxsize=None)
+def get_cache():
+    try:
+        return open_cache(CACHE_URL if CACHE_URL is not None else default_url())
+    except Exception as e:
+        _errors.update(count=_errors["count"] + 1, last=repr(e))
+        return NullCache()
+
+
+def fetch(namespace, key):
+    try:
+        return get_cache().get(namespace, key)
+    except Exception as e:
+        _errors.update(count=_errors["count"] + 1, last=repr(e))
+        return None
+
+
+def store(namespace, key, value, ttl=None):
+    try:
+        get_cache().set(namespace, key, value, ttl)
+    except Exception as e:
+        _errors.update(count=_errors["count"] + 1, last=repr(e))
+
+
+def fetch_text(namespace, key):
+    value = fetch(namespace, key)
+    return value.decode("utf-8") if value is not None else None
+
+
+def store_text(namespace, key, text, ttl=None):
+    store(namespace, key, text.encode("utf-8"), ttl)
+
+
+def stats():
+    cache = get_cache()
+    try:
+        namespaces = cache.stats()
+    except Exception as e:
+        _errors.update(count=_errors["count"] + 1, last=repr(e))
+        namespaces = {}
+    return {"backend": cache.name, "namespaces": namespaces, "errors": _errors["count"], "last_error": _errors["last"]}
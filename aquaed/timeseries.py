@@ -0,0 +1,268 @@
+"""Statewide water-quality history in a partitioned Parquet store.
+
+Sampling history for every California ZIP code is far too large to load into
+each server process, so it is stored on disk partitioned by county and year
+and read a partition at a time:
+
+    timeseries/
+      zip_index.parquet                      ZIP -> county, city
+      samples/county=<c>/year=<y>/part.parquet
+      rollups/<granularity>/county=<c>/part.parquet
+
+Rollups (mean, min, max and sample count per ZIP, contaminant and period) are
+precomputed per granularity when data is ingested. A trend query reads only
+the rollup partition of the ZIP's county and keeps recently used partitions in
+memory, grouped by ZIP; raw sample queries read only the years asked for and
+push the ZIP filter down to zip-sorted row groups.
+
+Ingest a CSV with ``ZIP``, ``County``, ``Date``, ``Contaminant``, ``Value``
+and optionally ``Unit`` and ``City`` columns:
+
+    python -m aquaed.timeseries ingest samples.csv [more.csv ...]
+"""
+import argparse
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+from aquaed import core
+from aquaed.lazy import lazy_import
+
+# pyarrow is imported inside the functions that use it: lazy_import can't
+# defer a submodule, since finding pyarrow.parquet imports pyarrow itself
+pd = lazy_import("pandas")
+
+STORE_DIR = os.environ.get("AQUAED_TIMESERIES_DIR", os.path.join(core.BASE_DIR, "timeseries"))
+# pandas period aliases for each rollup granularity
+GRANULARITIES = {"month": "M", "quarter": "Q", "year": "Y"}
+PARTITION_CACHE_SIZE = int(os.environ.get("AQUAED_TIMESERIES_CACHE", "32"))
+ROW_GROUP_SIZE = 16_384
+
+SAMPLE_COLUMNS = ["zip", "sampled_at", "contaminant", "value", "unit"]
+ROLLUP_COLUMNS = ["zip", "period", "contaminant", "mean", "min", "max", "count"]
+
+
+def partition_name(value):
+    return str(value).replace("/", "_").replace("=", "_")
+
+
+def zip_index_path(root=STORE_DIR):
+    return os.path.join(root, "zip_index.parquet")
+
+
+def sample_path(county, year, root=STORE_DIR):
+    return os.path.join(root, "samples", f"county={partition_name(county)}", f"year={int(year)}", "part.parquet")
+
+
+def rollup_path(granularity, county, root=STORE_DIR):
+    return os.path.join(root, "rollups", granularity, f"county={partition_name(county)}", "part.parquet")
+
+
+def available(root=STORE_DIR):
+    return os.path.exists(zip_index_path(root))
+
+
+def read_parquet(path, **kwargs):
+    import pyarrow.parquet as pq
+    return pq.read_table(path, **kwargs).to_pandas()
+
+
+def write_parquet(df, path, order):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Sorted by ZIP so readers filtering on one ZIP skip most row groups
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    table = pa.Table.from_pandas(df.sort_values(order).reset_index(drop=True), preserve_index=False)
+    pq.write_table(table, tmp, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+    os.replace(tmp, path)
+
+
+# --- Ingest ---
+def normalize(raw):
+    df = pd.DataFrame({
+        "zip": pd.to_numeric(raw["ZIP"], errors="raise").astype("int32"),
+        "county": raw["County"].astype(str).str.strip(),
+        "city": raw["City"].astype(str).str.strip() if "City" in raw else "",
+        "sampled_at": pd.to_datetime(raw["Date"], errors="raise"),
+        "contaminant": raw["Contaminant"].astype(str).str.strip(),
+        "value": pd.to_numeric(raw["Value"], errors="raise").astype("float64"),
+        "unit": raw["Unit"].astype(str).str.strip() if "Unit" in raw else "",
+    })
+    return df.dropna(subset=["sampled_at", "value"])
+
+
+def rollup(samples, granularity):
+    period = samples["sampled_at"].dt.to_period(GRANULARITIES[granularity]).dt.start_time
+    grouped = samples.assign(period=period).groupby(["zip", "period", "contaminant"], observed=True)["value"]
+    return grouped.agg(["mean", "min", "max", "count"]).reset_index()[ROLLUP_COLUMNS]
+
+
+def read_county_samples(county, root=STORE_DIR):
+    county_dir = os.path.dirname(os.path.dirname(sample_path(county, 0, root)))
+    if not os.path.isdir(county_dir):
+        return pd.DataFrame(columns=SAMPLE_COLUMNS)
+    parts = [read_parquet(os.path.join(county_dir, name, "part.parquet")) for name in sorted(os.listdir(county_dir))]
+    return pd.concat(parts, ignore_index=True)
+
+
+def ingest(raw, root=STORE_DIR):
+    """Merge new samples into the store and rebuild the rollups of every
+    county they touch. Returns the touched counties."""
+    df = normalize(raw)
+    for county, by_county in df.groupby("county"):
+        for year, new in by_county.groupby(by_county["sampled_at"].dt.year):
+            path = sample_path(county, year, root)
+            merged = new[SAMPLE_COLUMNS]
+            if os.path.exists(path):
+                merged = pd.concat([read_parquet(path), merged], ignore_index=True)
+            # A re-delivered sample replaces the earlier copy
+            merged = merged.drop_duplicates(["zip", "sampled_at", "contaminant"], keep="last")
+            write_parquet(merged, path, ["zip", "sampled_at"])
+        samples = read_county_samples(county, root)
+        for granularity in GRANULARITIES:
+            write_parquet(rollup(samples, granularity), rollup_path(granularity, county, root), ["zip", "period"])
+
+    index = df[["zip", "county", "city"]].drop_duplicates("zip", keep="last")
+    if os.path.exists(zip_index_path(root)):
+        index = pd.concat([read_parquet(zip_index_path(root)), index]).drop_duplicates("zip", keep="last")
+    write_parquet(index, zip_index_path(root), ["zip"])
+    _cache.clear()
+    return sorted(df["county"].unique())
+
+
+# --- Queries ---
+class PartitionCache:
+    """Recently read partitions, keyed by path and invalidated by mtime."""
+
+    def __init__(self, max_partitions=PARTITION_CACHE_SIZE):
+        self.max_partitions = max_partitions
+        self._lock = threading.Lock()
+        self._tables = OrderedDict()
+
+    def get(self, path, load):
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._tables.get(path)
+            if cached is not None and cached[0] == mtime:
+                self._tables.move_to_end(path)
+                return cached[1]
+        table = load(path)
+        with self._lock:
+            self._tables[path] = (mtime, table)
+            while len(self._tables) > self.max_partitions:
+                self._tables.popitem(last=False)
+        return table
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+
+
+_cache = PartitionCache()
+
+
+def county_for_zip(zip_code, root=STORE_DIR):
+    if not available(root):
+        return None
+    index = _cache.get(zip_index_path(root), lambda p: read_parquet(p).set_index("zip"))
+    zip_code = int(zip_code)
+    return index.at[zip_code, "county"] if zip_code in index.index else None
+
+
+def trend(zip_code, contaminant=None, granularity="month", start=None, end=None, root=STORE_DIR):
+    """Rollup rows for one ZIP, oldest first: ``period``, ``contaminant``,
+    ``mean``, ``min``, ``max``, ``count``. Empty if the store has no data."""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    county = county_for_zip(zip_code, root)
+    path = rollup_path(granularity, county, root) if county is not None else None
+    if path is None or not os.path.exists(path):
+        return pd.DataFrame(columns=ROLLUP_COLUMNS[1:])
+    # Whole county partitions are cached: later ZIPs in the same county are then a dict lookup
+    by_zip = _cache.get(path, lambda p: dict(tuple(read_parquet(p).groupby("zip"))))
+    rows = by_zip.get(int(zip_code))
+    if rows is None:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS[1:])
+    if contaminant is not None:
+        rows = rows[rows["contaminant"] == contaminant]
+    if start is not None:
+        rows = rows[rows["period"] >= pd.Timestamp(start)]
+    if end is not None:
+        rows = rows[rows["period"] <= pd.Timestamp(end)]
+    return rows.drop(columns="zip").sort_values(["contaminant", "period"]).reset_index(drop=True)
+
+
+def samples(zip_code, contaminant=None, start=None, end=None, root=STORE_DIR):
+    """Raw samples for one ZIP, reading only the year partitions in range."""
+    county = county_for_zip(zip_code, root)
+    if county is None:
+        return pd.DataFrame(columns=SAMPLE_COLUMNS[1:])
+    county_dir = os.path.dirname(os.path.dirname(sample_path(county, 0, root)))
+    first = pd.Timestamp(start).year if start is not None else None
+    last = pd.Timestamp(end).year if end is not None else None
+    filters = [("zip", "=", int(zip_code))]
+    if contaminant is not None:
+        filters.append(("contaminant", "=", contaminant))
+    parts = []
+    for name in sorted(os.listdir(county_dir)) if os.path.isdir(county_dir) else []:
+        year = int(name.split("=", 1)[1])
+        if (first is not None and year < first) or (last is not None and year > last):
+            continue
+        parts.append(read_parquet(os.path.join(county_dir, name, "part.parquet"), filters=filters))
+    if not parts:
+        return pd.DataFrame(columns=SAMPLE_COLUMNS[1:])
+    df = pd.concat(parts, ignore_index=True)
+    if start is not None:
+        df = df[df["sampled_at"] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df["sampled_at"] <= pd.Timestamp(end)]
+    return df.drop(columns="zip").sort_values("sampled_at").reset_index(drop=True)
+
+
+def status(root=STORE_DIR):
+    if not available(root):
+        return {"available": False, "root": root}
+    index = read_parquet(zip_index_path(root))
+    files, size = 0, 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(".parquet"):
+                files += 1
+                size += os.path.getsize(os.path.join(directory, name))
+    return {
+        "available": True,
+        "root": root,
+        "zip_codes": len(index),
+        "counties": int(index["county"].nunique()),
+        "partition_files": files,
+        "bytes": size,
+        "cached_partitions": len(_cache._tables),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the AquaED water-quality time-series store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest_cmd = sub.add_parser("ingest", help="merge sample CSVs into the store")
+    ingest_cmd.add_argument("paths", nargs="+")
+    trend_cmd = sub.add_parser("trend", help="print the rollup trend for a ZIP")
+    trend_cmd.add_argument("zip_code", type=int)
+    trend_cmd.add_argument("--contaminant")
+    trend_cmd.add_argument("--granularity", choices=list(GRANULARITIES), default="month")
+    for p in (ingest_cmd, trend_cmd):
+        p.add_argument("--root", default=STORE_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "ingest":
+        raw = pd.concat([pd.read_csv(path) for path in args.paths], ignore_index=True)
+        counties = ingest(raw, args.root)
+        print(f"Ingested {len(raw)} samples into {len(counties)} counties under {args.root}")
+    else:
+        print(trend(args.zip_code, args.contaminant, args.granularity, root=args.root).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Chunked, parallel text-to-speech.
+
+Long answers are split at sentence boundaries and up to ``MAX_IN_FLIGHT``
+chunks are sent to ``tts-1`` at once, so a clip takes about as long as its
+slowest chunks rather than the whole text. MP3 frames can be concatenated, so the chunks are
+stitched into one clip and cached for replay. ``stream_speech`` yields chunks
+in order as soon as each is ready, letting API clients start playback after
+the first one. ``st.audio`` can only play a complete clip, so the Streamlit
+app uses ``speech`` instead and hides the wait with ``prefetch``.
+"""
+import asyncio
+import hashlib
+import re
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from aquaed import core, replay, shared_cache
+from aquaed.clients import get_executor
+
+DEFAULT_VOICE = "nova"
+# The first chunk is kept short so it comes back quickly
+FIRST_CHUNK_CHARS = 200
+CHUNK_CHARS = 600
+# Longest text the API will synthesize, and chunks requested at once per clip
+MAX_TEXT_CHARS = 8000
+MAX_IN_FLIGHT = 6
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s+|\n+")
+
+
+def split_words(sentence, limit):
+    """Split a sentence longer than ``limit`` on whitespace, cutting words
+    that are themselves longer than ``limit``."""
+    pieces = []
+    current = ""
+    for word in sentence.split():
+        while len(word) > limit:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(word[:limit])
+            word = word[limit:]
+        if current and len(current) + 1 + len(word) > limit:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_text(text, first_chunk_chars=FIRST_CHUNK_CHARS, chunk_chars=CHUNK_CHARS):
+    """Split ``text`` into chunks at sentence (or line) boundaries. Runs of
+    text without either are split on whitespace, so no chunk is longer than
+    ``chunk_chars`` (tts-1 rejects input over 4096 characters)."""
+    chunks = []
+    current = ""
+    sentences = (
+        piece
+        for sentence in SENTENCE_END.split(text.strip())
+        for piece in (split_words(sentence, chunk_chars) if len(sentence) > chunk_chars else [sentence])
+    )
+    for sentence in sentences:
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        limit = first_chunk_chars if not chunks else chunk_chars
+        if current and len(current) + 1 + len(sentence) > limit:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def clip_key(text, voice=DEFAULT_VOICE):
+    return hashlib.sha256(f"{voice}\n{text}".encode()).hexdigest()
+
+
+class ClipCache:
+    """Stitched clips in LRU order, bounded by total bytes."""
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._clips = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            clip = self._clips.get(key)
+            if clip is not None:
+                self._clips.move_to_end(key)
+            return clip
+
+    def put(self, key, clip):
+        with self._lock:
+            if key in self._clips:
+                self._bytes -= len(self._clips.pop(key))
+            self._clips[key] = clip
+            self._bytes += len(clip)
+            while self._bytes > self.max_bytes and len(self._clips) > 1:
+                _, evicted = self._clips.popitem(last=False)
+                self._bytes -= len(evicted)
+
+
+clips = ClipCache()
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def cached_clip(text, voice=DEFAULT_VOICE):
+    """Clip from this process's cache, else from the shared cache tier."""
+    key = clip_key(text, voice)
+    clip = clips.get(key)
+    if clip is None:
+        clip = shared_cache.fetch("tts", key)
+        if clip is not None:
+            clips.put(key, clip)
+    if clip is not None:
+        replay.record_cached_speech(split_text(text), voice, clip)
+    return clip
+
+
+def store_clip(key, clip):
+    clips.put(key, clip)
+    shared_cache.store("tts", key, clip)
+
+
+def stream_speech(text, voice=DEFAULT_VOICE):
+    """Yield MP3 chunks for ``text`` in order, synthesizing all of them in
+    parallel. The stitched clip is cached once every chunk has arrived."""
+    key = clip_key(text, voice)
+    clip = cached_clip(text, voice)
+    if clip is not None:
+        yield clip
+        return
+
+    # A sliding window of MAX_IN_FLIGHT requests: the next chunk is submitted
+    # as each one is taken, so one long clip can't fill the shared pool
+    executor = get_executor()
+    chunks = iter(split_text(text))
+    futures = deque()
+
+    def submit_next():
+        chunk = next(chunks, None)
+        if chunk is not None:
+            futures.append(executor.submit(core.synthesize_speech, chunk, voice))
+
+    for _ in range(MAX_IN_FLIGHT):
+        submit_next()
+    parts = []
+    try:
+        while futures:
+            part = futures.popleft().result()
+            submit_next()
+            parts.append(part)
+            yield part
+    finally:
+        for future in futures:
+            future.cancel()
+    store_clip(key, b"".join(parts))
+
+
+def speech(text, voice=DEFAULT_VOICE):
+    """Return the full clip, joining a background ``prefetch`` if one is running."""
+    key = clip_key(text, voice)
+    clip = cached_clip(text, voice)
+    if clip is not None:
+        return clip
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+    if future is not None:
+        return future.result()
+    return b"".join(stream_speech(text, voice))
+
+
+def prefetch(text, voice=DEFAULT_VOICE):
+    """Start synthesizing in the background so the clip is ready (or nearly)
+    by the time the user presses play."""
+    key = clip_key(text, voice)
+    if cached_clip(text, voice) is not None:
+        return
+    with _in_flight_lock:
+        if key in _in_flight:
+            return
+        future = _in_flight[key] = Future()
+    # A dedicated thread rather than the shared executor, whose workers
+    # synthesize the chunks this thread waits on
+    threading.Thread(target=_run_prefetch, args=(key, future, text, voice), daemon=True).start()
+
+
+def _run_prefetch(key, future, text, voice):
+    try:
+        future.set_result(b"".join(stream_speech(text, voice)))
+    except Exception as e:
+        future.set_exception(e)
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+
+
+async def astream_speech(text, voice=DEFAULT_VOICE):
+    """Async counterpart of ``stream_speech`` for the API."""
+    key = clip_key(text, voice)
+    clip = await asyncio.to_thread(cached_clip, text, voice)
+    if clip is not None:
+        yield clip
+        return
+
+    slots = asyncio.Semaphore(MAX_IN_FLIGHT)
+
+    async def synthesize(chunk):
+        async with slots:
+            return await core.asynthesize_speech(chunk, voice)
+
+    tasks = [asyncio.ensure_future(synthesize(chunk)) for chunk in split_text(text)]
+    parts = []
+    try:
+        for task in tasks:
+            part = await task
+            parts.append(part)
+            yield part
+    finally:
+        for task in tasks:
+            task.cancel()
+    await asyncio.to_thread(store_clip, key, b"".join(parts))
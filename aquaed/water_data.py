@@ -0,0 +1,232 @@
+"""Versioned, hot-reloadable snapshot of ``bayareawater.csv``.
+
+The dataset is held as an immutable in-memory snapshot tagged with the
+SHA-256 of the file it was parsed from. A background thread polls the file;
+once a new version has stopped changing it is parsed, validated and diffed
+against the current snapshot by ZIP code, then swapped in with a single
+assignment, so every reader sees either the old table or the new one. Only
+the caches that depend on the changed ZIPs and cities are invalidated. A
+version that fails validation is rejected and the current one kept.
+
+Publish new data by writing a temp file and renaming it over the old one.
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from aquaed import core
+from aquaed.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+REQUIRED_COLUMNS = ["City", "ZIP Code", "Water Quality Score", "Common Contaminants", "Meets EPA Standards"]
+# Seconds between checks of the data file; 0 disables the watcher
+POLL_INTERVAL = float(os.environ.get("AQUAED_DATA_POLL_INTERVAL", "5"))
+HISTORY = 20
+
+
+class ValidationError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    version: str
+    df: object
+    signature: tuple
+    loaded_at: float
+
+
+@dataclass
+class DataDiff:
+    added: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+    changed: dict = field(default_factory=dict)  # ZIP -> names of the columns that changed
+    cities: set = field(default_factory=set)     # every city with an added, removed or changed ZIP
+
+    @property
+    def zips(self):
+        return set(self.added) | set(self.removed) | set(self.changed)
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def summary(self):
+        return f"{len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed ZIP codes"
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def validate(df):
+    """Raise ``ValidationError`` listing every problem found in ``df``."""
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValidationError(f"missing columns: {', '.join(missing)}")
+    problems = []
+    if df.empty:
+        problems.append("no rows")
+    if df[REQUIRED_COLUMNS].isna().any().any():
+        problems.append("empty cells in " + ", ".join(c for c in REQUIRED_COLUMNS if df[c].isna().any()))
+    zips = pd.to_numeric(df["ZIP Code"], errors="coerce")
+    if not zips.between(90000, 96199).all():
+        problems.append("ZIP codes outside California")
+    scores = pd.to_numeric(df["Water Quality Score"], errors="coerce")
+    if not scores.between(0, 100).all():
+        problems.append("water quality scores outside 0–100")
+    if not df["Meets EPA Standards"].isin(["Yes", "No"]).all():
+        problems.append("'Meets EPA Standards' values other than Yes/No")
+    if problems:
+        raise ValidationError("; ".join(problems))
+
+
+def parse(data):
+    df = pd.read_csv(io.BytesIO(data))
+    validate(df)
+    return df.astype({"ZIP Code": int, "Water Quality Score": int})
+
+
+def _rows_by_zip(df):
+    rows = {}
+    for row in df[REQUIRED_COLUMNS].itertuples(index=False):
+        rows.setdefault(int(row[1]), []).append(tuple(row))
+    return {zip_code: sorted(values) for zip_code, values in rows.items()}
+
+
+def diff(old, new):
+    """Compare two tables ZIP by ZIP (a ZIP may span several rows)."""
+    before, after = _rows_by_zip(old), _rows_by_zip(new)
+    result = DataDiff(
+        added=sorted(after.keys() - before.keys()),
+        removed=sorted(before.keys() - after.keys()),
+    )
+    for zip_code in before.keys() & after.keys():
+        if before[zip_code] != after[zip_code]:
+            old_rows, new_rows = before[zip_code], after[zip_code]
+            result.changed[zip_code] = sorted(
+                {name for i, name in enumerate(REQUIRED_COLUMNS) if {r[i] for r in old_rows} != {r[i] for r in new_rows}}
+            ) or ["rows"]
+    for zip_code in result.zips:
+        result.cities.update(row[0] for row in before.get(zip_code, []) + after.get(zip_code, []))
+    return result
+
+
+_lock = threading.Lock()
+_snapshot = None
+_history = deque(maxlen=HISTORY)
+_watcher = {}
+
+
+def _read(path):
+    # Take the signature before reading: if the file changes mid-read the
+    # next poll sees a different signature and reloads
+    signature = file_signature(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    return signature, data
+
+
+def current():
+    """The current snapshot, loaded on first use."""
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is None:
+        with _lock:
+            if _snapshot is None:
+                signature, data = _read(core.WATER_DATA_PATH)
+                _snapshot = Snapshot(hashlib.sha256(data).hexdigest(), parse(data), signature, time.time())
+            snapshot = _snapshot
+        start_watcher()
+    return snapshot
+
+
+def refresh(force=False):
+    """Load the data file if it changed; returns the ``DataDiff`` applied,
+    or None if nothing was swapped in."""
+    global _snapshot
+    current()
+    with _lock:
+        old = _snapshot
+        signature, data = _read(core.WATER_DATA_PATH)
+        if signature == _snapshot.signature and not force:
+            return None
+        version = hashlib.sha256(data).hexdigest()
+        if version == _snapshot.version:
+            _snapshot = Snapshot(version, _snapshot.df, signature, _snapshot.loaded_at)
+            return None
+        try:
+            df = parse(data)
+        except Exception as e:
+            _history.append({"at": time.time(), "version": version[:12], "status": "rejected", "detail": str(e)})
+            # Remember the signature so a bad file isn't re-parsed every poll
+            _snapshot = Snapshot(_snapshot.version, _snapshot.df, signature, _snapshot.loaded_at)
+            return None
+        changes = diff(old.df, df)
+        new = Snapshot(version, df, signature, time.time())
+        _snapshot = new
+        _history.append({"at": new.loaded_at, "version": version[:12], "status": "loaded", "detail": changes.summary()})
+    invalidate(old, new, changes)
+    return changes
+
+
+def invalidate(old, new, changes):
+    """Drop cached results that depend on the ZIPs and cities in ``changes``.
+
+    Shared-cache LLM answers need nothing here: the prompts that depend on a
+    ZIP's data embed it, so changed data produces new cache keys.
+    """
+    from aquaed import aggregates, prompt_cache
+
+    zips = {str(z) for z in changes.zips}
+    prompt_cache.recommendations.invalidate(lambda key: key[0] in zips)
+    if set(old.df["City"]) != set(new.df["City"]):
+        prompt_cache.reset_cities()
+    aggregates.update(old, new, changes.cities)
+
+
+def _watch():
+    pending = None
+    while True:
+        time.sleep(POLL_INTERVAL)
+        try:
+            signature = file_signature(core.WATER_DATA_PATH)
+        except OSError:
+            continue
+        if signature == _snapshot.signature:
+            pending = None
+        elif signature != pending:
+            # Wait for one unchanged poll so a file still being written isn't loaded
+            pending = signature
+        else:
+            try:
+                refresh()
+            except Exception as e:
+                _history.append({"at": time.time(), "version": None, "status": "error", "detail": str(e)})
+            pending = None
+
+
+def start_watcher():
+    if POLL_INTERVAL <= 0:
+        return
+    with _lock:
+        if _watcher.get("thread") is None:
+            _watcher["thread"] = threading.Thread(target=_watch, name="aquaed-data-watcher", daemon=True)
+            _watcher["thread"].start()
+
+
+def status():
+    snapshot = current()
+    return {
+        "version": snapshot.version[:12],
+        "rows": len(snapshot.df),
+        "zip_codes": int(snapshot.df["ZIP Code"].nunique()),
+        "loaded_at": snapshot.loaded_at,
+        "watching": _watcher.get("thread") is not None,
+        "history": list(_history)[::-1],
+    }
@@ -1,41 +1,30 @@
 import streamlit as st
-import pandas as pd
-import openai
-import requests
 import random
-import json
-import tempfile
-from dotenv import load_dotenv
-from fpdf import FPDF
-from openai import OpenAI
-from streamlit_folium import st_folium
-import folium
 
-# --- Load environment variables ---
-load_dotenv()
-
-OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
-GOOGLEMAPS_API_KEY = st.secrets["GOOGLEMAPS_API_KEY"]
-client = OpenAI(api_key=OPENAI_API_KEY)
+from aquaed import aggregates, core, images, memprof, nearby, replay, sessions, timeseries, tts
+from aquaed.contaminants import get_index as get_contaminant_index
+from aquaed.admin import is_admin_request, render_admin
+from aquaed.clients import fan_out
 
 def get_random_water_image():
-    water_images = [
-        "https://i.imgur.com/sfixLBQ.png",  # pouring water
-        "https://i.imgur.com/iQEoOxk.png",  # washing fruits
-        "https://i.imgur.com/EFO5i7u.png",  # faucet
-        "https://i.imgur.com/cQ17Ktm.png",  # flower on water
-        "https://i.imgur.com/JwXE4Iw.png"   # child drinking water
-        "https://i.imgur.com/WPmxxfk.png"   # child drinking water
-    ]
-    return random.choice(water_images)
+    return random.choice(images.HOME_IMAGES)
 
 # --- Page config ---
 st.set_page_config(page_title="AquaED", page_icon="💧", layout="wide")
 
+# --- Session accounting and temp-file cleanup ---
+sessions.track(st.session_state)
+memprof.track_rerun()
+replay.record_rerun(st.session_state)
+
+if is_admin_request():
+    render_admin()
+    st.stop()
+
 # --- Perfectly Centered Logo, Title, and Subtitle (using pure HTML) ---
-st.markdown("""
+st.markdown(f"""
 <div style="display: flex; flex-direction: column; align-items: center; justify-content: center; margin-top: -40px;">
-    <img src="https://i.imgur.com/KpJbbvV.png" style="width: 500px; height: auto; margin-bottom: -10px;">
+    {images.img_tag(images.LOGO_URL, images.LOGO_WIDTH, alt="AquaED", style="margin-bottom: -10px;", lazy=False)}
     <h1 style="color:#003049; font-size:48px; margin-top: 0px;">Water Quality Made Simple</h1>
     <h3 style="color:#0077B6; font-size:20px; font-weight: normal; margin-top: 5px;">Explore, Learn, and Protect Your Water</h3>
 </div>
@@ -96,7 +85,11 @@ with main_tabs[0]:
 
     # Show rotating water-themed image
     image_url = get_random_water_image()
-    st.image(image_url, caption="💧 Clean water, clean future", width=450)
+    st.markdown(
+        f"<figure>{images.img_tag(image_url, images.HOME_WIDTH, lazy=False)}"
+        f"<figcaption>💧 Clean water, clean future</figcaption></figure>",
+        unsafe_allow_html=True,
+    )
     
     st.markdown("---")  # Optional visual divider
 
@@ -129,36 +122,18 @@ with main_tabs[0]:
 with main_tabs[1]:
     st.header("📚 AquaEducator")
 
-    client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
-
     language_option = st.selectbox(
         "🌐 Select Language:",
-        ("English", "Spanish", "Vietnamese", "Mandarin", "Korean"),
+        core.LANGUAGES,
         key="educator_language"
     )
 
     edu_tabs = st.tabs(["🌊 Water FAQs", "💧 Water Quality Quiz"])
 
-    def get_completion(prompt, model="gpt-3.5-turbo"):
-        completion = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are an expert on water quality."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        return completion.choices[0].message.content
-
     def speak_text(text, voice="nova"):
+        # Joins the background synthesis started by tts.prefetch, if any
         try:
-            response = openai.audio.speech.create(
-                model="tts-1",
-                voice=voice,
-                input=text
-            )
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp:
-                tmp.write(response.read())
-                return tmp.name
+            return tts.speech(text, voice=voice)
         except Exception:
             st.warning("TTS failed.")
             return None
@@ -169,72 +144,46 @@ with main_tabs[1]:
 
         if "fun_fact" not in st.session_state:
             st.session_state.fun_fact = ""
-            st.session_state.fun_fact_audio = None
 
         with st.form("fun_fact_form"):
-            city_prompt = st.text_input("Enter your city for a fun fact:")
+            city_prompt = st.text_input("Enter your city for a fun fact:", max_chars=core.MAX_CITY_CHARS)
             submitted = st.form_submit_button("🔍 Generate Fun Fact")
 
         if submitted and city_prompt:
-            fact_prompt = (
-                f"Give one short, interesting fun fact about {city_prompt}'s water quality. "
-                f"Translate into {language_option}. Start it with 'Did you know?'"
-            )
-            fact = get_completion(fact_prompt)
+            fact = core.get_fun_fact(city_prompt, language_option)
             st.session_state.fun_fact = fact
-            st.session_state.fun_fact_audio = speak_text(fact)
+            tts.prefetch(fact)
 
         if st.session_state.fun_fact:
             st.write(st.session_state.fun_fact)
             if st.button("🔈 Play Fun Fact"):
-                if st.session_state.fun_fact_audio:
-                    st.audio(st.session_state.fun_fact_audio)
+                audio = speak_text(st.session_state.fun_fact)
+                if audio:
+                    st.audio(audio, format="audio/mpeg")
 
     # --- 📖 Water Quality FAQ --
         st.subheader("📖 Water Quality FAQs")
 
         if "faq_answer" not in st.session_state:
             st.session_state.faq_answer = ""
-            st.session_state.faq_audio = None
-
-        questions = [
-            "What is pH in water?",
-            "How can I measure water quality at home?",
-            "Why is chlorine added to water?",
-            "What are nitrates and why are they bad?",
-            "How is my water cleaned?",
-            "What are safe levels of lead in water?",
-            "Where are the water treatment plants in Santa Clara County?"
-        ]
 
-        selected_question = st.selectbox("Select a question:", questions)
+        selected_question = st.selectbox("Select a question:", core.FAQ_QUESTIONS)
 
         if selected_question:
             with st.spinner("Fetching answers..."):
                 try:
-                    translation_note = f"Translate into {language_option}." if language_option != "English" else ""
-                    faq_prompt = (
-                        f"Answer '{selected_question}' with bullet points based on Santa Clara County. {translation_note}."
-                    )
-                    
-                    response = client.chat.completions.create(
-                        model="gpt-3.5-turbo",
-                        messages=[
-                            {"role": "system", "content": "Expert in Santa Clara County water quality and Valley Water services."},
-                            {"role": "user", "content": faq_prompt}
-                        ]
-                    )
-                    answer = response.choices[0].message.content
+                    answer = core.answer_faq(selected_question, language_option)
                     st.session_state.faq_answer = answer
-                    st.session_state.faq_audio = speak_text(answer)
+                    tts.prefetch(answer)
                 except Exception as e:
                     st.error(f"Error: {e}")
 
         if st.session_state.faq_answer:
             st.markdown(f"**Answer:** {st.session_state.faq_answer}")
             if st.button("🔈 Play FAQ Answer"):
-                if st.session_state.faq_audio:
-                    st.audio(st.session_state.faq_audio)
+                audio = speak_text(st.session_state.faq_answer)
+                if audio:
+                    st.audio(audio, format="audio/mpeg")
 
         st.markdown("""
         🔗 **Learn more about water quality in Santa Clara County:**  
@@ -244,42 +193,25 @@ with main_tabs[1]:
     # --- 💧 Water Quality Quiz ---
     with edu_tabs[1]:
         st.subheader("💧 Water Quality Quiz")
-        MAX_QUESTIONS = 3
-
-        def load_questions(filepath="questions.json"):
-            with open(filepath, "r") as f:
-                return json.load(f)
-
-        def generate_explanation(question_text, correct_answer):
-            prompt = (
-                f"Question: {question_text}\n"
-                f"Correct Answer: {correct_answer}\n"
-                f"Explain why this is the correct answer. Translate to {language_option}."
-            )
-            try:
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are a water educator."},
-                        {"role": "user", "content": prompt}
-                    ]
-                )
-                return response.choices[0].message.content.strip()
-            except Exception as e:
-                return f"❌ Could not generate explanation: {e}"
+        MAX_QUESTIONS = core.MAX_QUESTIONS
 
         if "all_questions" not in st.session_state:
-            st.session_state.all_questions = load_questions()
-            random.shuffle(st.session_state.all_questions)
-            st.session_state.all_questions = st.session_state.all_questions[:MAX_QUESTIONS]
-            st.session_state.answers = [None] * MAX_QUESTIONS
-            st.session_state.explanations = [""] * MAX_QUESTIONS
+            st.session_state.all_questions = core.sample_quiz(MAX_QUESTIONS, language_option, rng=replay.session_rng(st.session_state))
+            st.session_state.answers = [None] * len(st.session_state.all_questions)
+            st.session_state.explanations = [""] * len(st.session_state.all_questions)
             st.session_state.submitted_all = False
 
         if st.button("✅ Submit All"):
             st.session_state.submitted_all = True
             st.rerun()
 
+        if st.session_state.submitted_all:
+            # Explanations are independent, so request them all at once
+            generated = fan_out(*[
+                (lambda q=q: core.generate_explanation(q["question"], q["answer"], language_option))
+                for q in st.session_state.all_questions
+            ])
+
         for idx, q in enumerate(st.session_state.all_questions):
             st.subheader(f"Q{idx+1}: {q['question']}")
             st.session_state.answers[idx] = st.radio(
@@ -293,24 +225,21 @@ with main_tabs[1]:
                 correct_answer = q["answer"]
                 if user_answer == correct_answer:
                     st.success("✅ Correct!")
-                    st.session_state.explanations[idx] = generate_explanation(q["question"], correct_answer)
+                    st.session_state.explanations[idx] = generated[idx]
                 else:
                     st.error(f"❌ Incorrect. Your answer: {user_answer}")
-                    st.session_state.explanations[idx] = f"The correct answer is **{correct_answer}**.\n\n" + generate_explanation(q["question"], correct_answer)
+                    st.session_state.explanations[idx] = f"The correct answer is **{correct_answer}**.\n\n" + generated[idx]
 
                 st.info(st.session_state.explanations[idx])
 
                 if st.button(f"🔈 Play Explanation for Q{idx+1}", key=f"tts_{idx}"):
-                    audio_path = speak_text(st.session_state.explanations[idx])
-                    if audio_path:
-                        st.audio(audio_path)
+                    audio = speak_text(st.session_state.explanations[idx])
+                    if audio:
+                        st.audio(audio, format="audio/mpeg")
 
         if st.session_state.submitted_all:
-            score = sum(
-                1 for idx, q in enumerate(st.session_state.all_questions)
-                if st.session_state.answers[idx] == q["answer"]
-            )
-            st.success(f"🎉 Your Final Score: {score} / {MAX_QUESTIONS}")
+            score = core.score_quiz(st.session_state.all_questions, st.session_state.answers)
+            st.success(f"🎉 Your Final Score: {score} / {len(st.session_state.all_questions)}")
 
             if st.button("🔁 Restart Quiz"):
                 for key in list(st.session_state.keys()):
@@ -323,24 +252,15 @@ with main_tabs[1]:
 with main_tabs[2]:
     st.header("💧 AquaEdvisor")
 
-    product_df = pd.read_csv("water_filter_recommendations_detailed.csv")
-
-    budget_mapping = {
-        "Under $50": 50,
-        "$50–$100": 100,
-        "$100–$200": 200,
-        "Over $200": float('inf')
-    }
-
     advisor_language = st.selectbox(
         "🌐 Select Language:", 
-        ["English", "Spanish", "Vietnamese", "Mandarin", "Korean"], 
+        core.LANGUAGES, 
         key="advisor_language"
     )
 
     zip_code = st.text_input("Enter your ZIP code:")
     issues = st.text_area("Describe any water issues you've noticed:")
-    budget = st.selectbox("Select your budget:", list(budget_mapping.keys()))
+    budget = st.selectbox("Select your budget:", list(core.BUDGET_MAPPING.keys()))
 
     is_parent = st.checkbox("Young children at home")
     is_renter = st.checkbox("I rent my home")
@@ -352,69 +272,37 @@ with main_tabs[2]:
 
     if st.button("Generate Recommendations"):
         with st.spinner("Analyzing your water profile..."):
-            traits = []
-            if is_parent: traits.append("parent with young children")
-            if is_renter: traits.append("renter")
-            if is_senior: traits.append("senior citizen")
-            if is_eco_focused: traits.append("eco-conscious")
-            user_traits = ", ".join(traits) if traits else "general user"
-
-            prompt = f"""
-            You are a helpful assistant. The user lives in ZIP code {zip_code}.
-            Water issues: {issues}.
-            Budget: {budget}.
-            Traits: {user_traits}.
-            Provide a brief water quality concern summary and filter system recommendations.
-            Translate into {advisor_language}.
-            """
+            user_traits = core.describe_traits(is_parent, is_renter, is_senior, is_eco_focused)
 
             try:
-                response = client.chat.completions.create(
-                    model="gpt-4",
-                    messages=[
-                        {"role": "system", "content": "You are a water quality expert."},
-                        {"role": "user", "content": prompt}
-                    ]
+                filtered_products = core.filter_products(budget)
+
+                # The summary and the product translation don't depend on each other
+                recommendations_text, translated_products = fan_out(
+                    lambda: core.recommend_filters(zip_code, issues, budget, user_traits, advisor_language),
+                    lambda: core.translate_products(filtered_products, advisor_language),
                 )
-                recommendations_text = response.choices[0].message.content
                 st.success("Here are your personalized recommendations:")
                 st.markdown(recommendations_text)
 
                 st.subheader("🛍️ Featured Water Filters")
 
-                budget_limit = budget_mapping[budget]
-                filtered_products = product_df[product_df["Price_Value"] <= budget_limit]
-
                 for _, row in filtered_products.iterrows():
                     st.markdown(f"### [{row['Product Name']}]({row['Link']})")
-                    st.image(row['Image_URL'], width=500)
+                    st.markdown(images.img_tag(row['Image_URL'], images.PRODUCT_WIDTH, alt=row['Product Name']), unsafe_allow_html=True)
                     st.markdown(f"**Type:** {row['Type']}  |  **Price:** {row['Price']}")
                     st.markdown(f"**Best For:** {row['Best For']}")
                     st.markdown(f"**Pros:** {row['Pros']}")
                     st.markdown(f"**Cons:** {row['Cons']}")
                     st.markdown("---")
 
-                product_text = "\n\n".join([
-                    f"Name: {row['Product Name']}\nDescription: {row['Description']}\nPrice: {row['Price']}\nPros: {row['Pros']}\nCons: {row['Cons']}\nLink: {row['Link']}"
-                    for _, row in filtered_products.iterrows()
-                ])
-                translation_prompt = f"Translate this product information into {advisor_language}:\n\n{product_text}"
-
-                translation_response = client.chat.completions.create(
-                    model="gpt-4",
-                    messages=[
-                        {"role": "system", "content": "You are a professional translator."},
-                        {"role": "user", "content": translation_prompt}
-                    ]
-                )
-                translated_text = translation_response.choices[0].message.content
-                translated_products = translated_text.split("\n\n")
-
             except Exception as e:
                 st.error(f"Something went wrong: {e}")
 
     # --- Download PDF
     if recommendations_text and translated_products and st.button("📄 Download Report as PDF"):
+        from fpdf import FPDF
+
         pdf = FPDF()
         pdf.add_page()
         pdf.set_font("Arial", size=12)
@@ -426,8 +314,9 @@ with main_tabs[2]:
             pdf.set_font("Arial", '', 12)
             pdf.multi_cell(0, 10, product_text)
 
-        pdf.output("Water_Quality_Report.pdf")
-        with open("Water_Quality_Report.pdf", "rb") as f:
+        report_path = sessions.new_artifact(".pdf")
+        pdf.output(report_path)
+        with open(report_path, "rb") as f:
             st.download_button("Download PDF", f, file_name="Water_Quality_Report.pdf")
 
 # ===============================
@@ -435,48 +324,62 @@ with main_tabs[2]:
 with main_tabs[3]:
     st.header("📍 AquaMap: A Location-based Water Quality Tool")
 
-    df = pd.read_csv("bayareawater.csv")
-
-    def get_zip(lat, lon):
-        url = f"https://maps.googleapis.com/maps/api/geocode/json?latlng={lat},{lon}&key={GOOGLEMAPS_API_KEY}"
-        response = requests.get(url)
-        data = response.json()
-        if data["status"] == "OK":
-            for component in data["results"][0]["address_components"]:
-                if "postal_code" in component["types"]:
-                    return component["short_name"]
-        return None
-
-    def get_completion(prompt, model="gpt-3.5-turbo"):
-        completion = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "Reply with a list of four issues regarding water quality for the user's given city correlating with their zip code response. You must mention the name of the city. Each entry in the list should be no more than 4 sentences long. Details should be specific to the location. Please add 'Continue exploring the app to see what solutions might work for you at home!' at the end of your response."},
-                {"role": "user", "content": prompt},
-            ]
-        )
-        return completion.choices[0].message.content
-
     def print_quality_info(zip_code):
-        match = df[df["ZIP Code"] == zip_code]
-        if match.empty:
+        info = core.lookup_zip(zip_code)
+        if info is None:
             st.write("Water quality score data could not be found for this location.")
         else:
-            entry = match.iloc[0]
-            metro = entry["City"]
-            score = entry["Water Quality Score"]
-            contaminants = entry["Common Contaminants"]
-            epa_status = "does" if entry["Meets EPA Standards"] == "Yes" else "does not"
-            st.write(f"{metro} (ZIP code {zip_code}) has a water quality score of {score}, which {epa_status} meet EPA standards. Some common contaminants in {metro}'s water include: {contaminants}.")
+            st.write(core.describe_quality(info))
+            facts = aggregates.city_facts(info["city"])
+            if facts:
+                st.write(aggregates.describe_city(facts))
+
+    def print_neighbors(zip_code, lat, lon):
+        comparison = nearby.compare(zip_code, lat, lon)
+        if comparison is None or not comparison["nearest"]:
+            return
+        st.write("**Nearby ZIP codes**")
+        st.dataframe([
+            {
+                "ZIP Code": n["zip_code"],
+                "City": n["city"],
+                "Score": n["score"],
+                "Meets EPA": "Yes" if n["meets_epa"] else "No",
+                "Distance (km)": n["distance_km"],
+            }
+            for n in comparison["nearest"]
+        ], hide_index=True, width="stretch")
+        radius = f"{comparison['radius_km']:g} km"
+        better = comparison["nearest_higher_score"]
+        if better:
+            st.write(f"Closest ZIP with a higher score within {radius}: {better['zip_code']} ({better['city']}), score {better['score']}, {better['distance_km']} km away.")
+        passing = comparison["nearest_meeting_epa"]
+        if passing:
+            st.write(f"Closest ZIP meeting EPA standards within {radius}: {passing['zip_code']} ({passing['city']}), {passing['distance_km']} km away.")
+
+    def print_trend(zip_code):
+        history = timeseries.trend(zip_code, granularity="quarter")
+        if history.empty:
+            return
+        st.write(f"**Contaminant levels in {zip_code} by quarter**")
+        st.line_chart(history.pivot(index="period", columns="contaminant", values="mean"))
 
     st.markdown("""
     Please select your location on the map and click "Submit Location" to learn more about water quality in your city. 
     For large cities selected within the San Francisco Bay Area, additional information will be provided about water quality scores and common contaminants.
     """)
 
-    map = folium.Map(location=[37.6110, -122.2050], zoom_start=10)
-    map.add_child(folium.LatLngPopup())
-    map_data = st_folium(map, width=700, height=500)
+    # Imported here so the other tabs are already streamed to the browser while the map libraries load
+    import folium
+    from streamlit_folium import st_folium
+
+    aquamap = folium.Map(location=[37.6110, -122.2050], zoom_start=10)
+    aquamap.add_child(folium.LatLngPopup())
+    # Only clicks are returned, so panning and zooming stay in the browser and
+    # never rerun the app; the component debounces events by 250 ms and sends
+    # nothing unless the returned value changed. The fixed key keeps the map
+    # mounted, with the user's view, across reruns.
+    map_data = st_folium(aquamap, key="aquamap", width=700, height=500, returned_objects=["last_clicked"])
 
     if map_data and map_data.get("last_clicked"):
         latitude = map_data["last_clicked"]["lat"]
@@ -484,11 +387,41 @@ with main_tabs[3]:
 
     if st.button("Submit Location"):
         if 'latitude' in locals() and 'longitude' in locals():
-            user_zip = get_zip(latitude, longitude)
+            user_zip = core.get_zip(latitude, longitude)
             if user_zip:
                 print_quality_info(int(user_zip))
-                st.write(get_completion(user_zip))
+                print_neighbors(int(user_zip), latitude, longitude)
+                st.write(core.get_city_issues(user_zip))
+                print_trend(int(user_zip))
             else:
                 st.error("Could not determine ZIP code from selected location.")
         else:
             st.error("Please click a location on the map first.")
+
+    with st.expander("🔎 Find ZIP codes by contaminant"):
+        contaminant_index = get_contaminant_index()
+        filter_col1, filter_col2, filter_col3 = st.columns(3)
+        with filter_col1:
+            selected_contaminants = st.multiselect("Contaminants:", contaminant_index.vocabulary, key="map_contaminants")
+        with filter_col2:
+            city_filter = st.selectbox("City:", ["All cities"] + sorted(contaminant_index.by_city), key="map_city_filter")
+        with filter_col3:
+            epa_filter = st.radio("EPA standards:", ["Any", "Meets", "Fails"], horizontal=True, key="map_epa_filter")
+
+        city_value = None if city_filter == "All cities" else city_filter
+        epa_value = {"Any": None, "Meets": True, "Fails": False}[epa_filter]
+        if selected_contaminants or city_value or epa_value is not None:
+            matches = contaminant_index.query(selected_contaminants, meets_epa=epa_value, city=city_value)
+            st.write(f"**{len(matches)}** ZIP code(s) match: {', '.join(str(z) for z in matches) or '—'}")
+        top = contaminant_index.top_contaminants(5, city=city_value, meets_epa=epa_value)
+        if top:
+            st.write("Top contaminants: " + ", ".join(f"{name} ({count})" for name, count in top))
+
+    with st.expander("📊 Bay Area city overview"):
+        overview = aggregates.load()
+        st.dataframe(
+            overview[["City", "ZIP Count", "Mean Score", "Min Score", "Max Score", "EPA Share"]],
+            hide_index=True,
+            width="stretch",
+            column_config={"EPA Share": st.column_config.ProgressColumn("Meets EPA", format="percent", min_value=0, max_value=1)},
+        )
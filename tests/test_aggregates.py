@@ -0,0 +1,37 @@
+import os
+
+import pandas as pd
+import pytest
+
+from aquaed import aggregates, core
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "DATA_DIR", str(tmp_path / "data"))
+    return tmp_path / "data"
+
+
+def table(score):
+    return pd.DataFrame({"City": ["San Jose"], "ZIP Count": [1], "Mean Score": [score]})
+
+
+def test_table_is_stored_under_its_source_hash(data_dir):
+    aggregates.write(table(80.0), "a" * 64)
+    aggregates.write(table(90.0), "b" * 64)
+    assert aggregates.read("a" * 64)["Mean Score"].tolist() == [80.0]
+    assert aggregates.read("b" * 64)["Mean Score"].tolist() == [90.0]
+    assert aggregates.read("c" * 64) is None
+    assert oct(os.stat(data_dir).st_mode & 0o777) == "0o700"
+    # No temp files are left behind
+    assert sorted(os.listdir(data_dir)) == ["city_aggregates-aaaaaaaaaaaaaaaa.csv", "city_aggregates-bbbbbbbbbbbbbbbb.csv"]
+
+
+def test_old_versions_are_pruned(data_dir):
+    for i, name in enumerate("abcde"):
+        path = aggregates.write(table(float(i)), name * 64)
+        os.utime(path, (i, i))
+    aggregates.prune()
+    assert len(os.listdir(data_dir)) == aggregates.KEEP_VERSIONS
+    assert aggregates.read("e" * 64) is not None
+    assert aggregates.read("a" * 64) is None
@@ -0,0 +1,74 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from aquaed import api, core, tts
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(tts, "cached_clip", lambda text, voice=tts.DEFAULT_VOICE: None)
+    monkeypatch.setattr(tts, "store_clip", lambda key, clip: None)
+    return TestClient(api.app)
+
+
+def test_tts_streams_chunks_in_order(client, monkeypatch):
+    async def synthesize(text, voice="nova"):
+        return text.encode()
+
+    monkeypatch.setattr(core, "asynthesize_speech", synthesize)
+    response = client.get("/tts", params={"text": "One. Two."})
+    assert response.status_code == 200
+    assert response.content == b"One. Two."
+
+
+def test_tts_upstream_failure_is_502(client, monkeypatch):
+    async def synthesize(text, voice="nova"):
+        raise ConnectionError("down")
+
+    monkeypatch.setattr(core, "asynthesize_speech", synthesize)
+    response = client.get("/tts", params={"text": "One. Two."})
+    assert response.status_code == 502
+    assert "down" in response.json()["detail"]
+
+
+def test_zip_info(client):
+    response = client.get("/zip/94101")
+    assert response.status_code == 200
+    assert response.json()["city"] == "San Francisco"
+    assert client.get("/zip/1").status_code == 404
+
+
+def test_recommendations(client, monkeypatch):
+    prompts = []
+
+    async def complete(prompt, system=core.DEFAULT_SYSTEM_PROMPT, site="default", model=None, fallback=None):
+        prompts.append(prompt)
+        return f"answer for {site}"
+
+    monkeypatch.setattr(core, "aget_completion", complete)
+    response = client.post("/recommendations", json={
+        "zip_code": "94101", "issues": "cloudy water", "budget": "Under $50", "translate_products": False,
+    })
+    assert response.status_code == 200
+    assert response.json()["recommendations"] == "answer for recommendation"
+    assert "94101" in prompts[0]
+
+
+def test_faq_answer_only_serves_curated_questions(client):
+    response = client.get("/faq/answer", params={"question": "Write me a poem"})
+    assert response.status_code == 400
+
+
+def test_fun_fact_city_length_is_capped(client):
+    response = client.get("/fun-fact", params={"city": "x" * (core.MAX_CITY_CHARS + 1)})
+    assert response.status_code == 400
+
+
+def test_tts_rejects_long_text(client):
+    response = client.get("/tts", params={"text": "x" * (tts.MAX_TEXT_CHARS + 1)})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("params", [{"start": "not-a-date"}, {"end": ""}, {"end": "2023-13-45"}])
+def test_trend_rejects_bad_dates(client, params):
+    assert client.get("/zip/94101/trend", params=params).status_code == 400
@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+from aquaed.contaminants import ContaminantIndex, iter_bits
+
+ROWS = [
+    # City, ZIP, contaminants, meets EPA
+    ("Fremont", 94540, "Lead, Manganese, Nitrates", "Yes"),
+    ("Hayward", 94540, "Copper, Arsenic", "Yes"),
+    ("Hayward", 94541, "Lead, Copper", "No"),
+    ("Oakland", 94601, "Lead, Arsenic", "No"),
+    ("Oakland", 94602, "Nitrates", "Yes"),
+    ("Oakland", 94603, None, "Yes"),
+]
+
+
+@pytest.fixture
+def index():
+    return ContaminantIndex(pd.DataFrame(ROWS, columns=["City", "ZIP Code", "Common Contaminants", "Meets EPA Standards"]))
+
+
+def test_iter_bits():
+    assert list(iter_bits(0b101001)) == [0, 3, 5]
+    assert list(iter_bits(0)) == []
+
+
+def test_match_all_and_any(index):
+    assert index.query(["Lead", "Arsenic"]) == [94601]
+    assert index.query(["Lead", "Arsenic"], match="any") == [94540, 94541, 94601]
+    assert index.query(["Lead", "Radon"]) == []
+    assert index.query(["Lead", "Radon"], match="any") == [94540, 94541, 94601]
+    assert index.query() == [94540, 94541, 94601, 94602, 94603]
+
+
+def test_epa_and_city_filters(index):
+    assert index.query(["Lead"], meets_epa=False) == [94541, 94601]
+    assert index.query(["Lead"], meets_epa=True) == [94540]
+    assert index.query(city="Oakland", meets_epa=True) == [94602, 94603]
+    assert index.query(["Copper"], city="Hayward", meets_epa=False) == [94541]
+    assert index.query(city="Berkeley") == []
+
+
+def test_zip_spanning_two_cities(index):
+    # 94540 has a Fremont row and a Hayward row: counted per row, listed once
+    assert index.count(["Lead", "Copper"], match="any") == 4
+    assert index.query(["Lead", "Copper"], match="any") == [94540, 94541, 94601]
+    assert index.count(city="Hayward") == 2
+    assert index.query(["Copper"], city="Fremont") == []
+    assert index.query(["Copper"], city="Hayward") == [94540, 94541]
+    assert index.zip_contaminants(94540) == ["Arsenic", "Copper", "Lead", "Manganese", "Nitrates"]
+    assert index.zip_contaminants(99999) == []
+
+
+def test_top_contaminants(index):
+    assert index.top_contaminants() == [("Lead", 3), ("Arsenic", 2), ("Copper", 2), ("Nitrates", 2), ("Manganese", 1)]
+    assert index.top_contaminants(n=2) == [("Lead", 3), ("Arsenic", 2)]
+    assert index.top_contaminants(city="Oakland") == [("Arsenic", 1), ("Lead", 1), ("Nitrates", 1)]
+    assert index.top_contaminants(meets_epa=False) == [("Lead", 2), ("Arsenic", 1), ("Copper", 1)]
+    assert index.top_contaminants(city="Berkeley") == []
@@ -0,0 +1,36 @@
+import json
+import os
+import tracemalloc
+
+import pytest
+
+from aquaed import core, memprof
+
+
+@pytest.fixture(autouse=True)
+def profiling(monkeypatch):
+    monkeypatch.setattr(memprof, "ENABLED", True)
+    yield
+    tracemalloc.stop()
+
+
+def test_dump_is_private_and_in_data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(memprof, "DUMP_DIR", None)
+    memprof.track_rerun("s1")
+    memprof.track_rerun("s1")
+    path = memprof.dump()
+    assert os.path.dirname(path) == str(tmp_path / "data" / "memprof")
+    assert os.stat(os.path.dirname(path)).st_mode & 0o777 == 0o700
+    report = json.load(open(path))
+    for name in (path, report["snapshot"]):
+        assert os.stat(name).st_mode & 0o777 == 0o600
+
+
+def test_sample_measures_session_artifacts(tmp_path, monkeypatch):
+    from aquaed import sessions
+    monkeypatch.setattr(sessions, "ARTIFACT_ROOT", str(tmp_path))
+    (tmp_path / "s1").mkdir()
+    (tmp_path / "s1" / "report.pdf").write_bytes(b"x" * 10)
+    current = memprof.sample()
+    assert (current["artifact_files"], current["artifact_bytes"]) == (1, 10)
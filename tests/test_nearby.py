@@ -0,0 +1,61 @@
+import math
+
+import pandas as pd
+import pytest
+
+from aquaed import nearby
+
+# Synthetic centroids strung out east of a point, about 0, 5, 10, 20 and 40 km away
+ORIGIN = (37.3, -121.9)
+OFFSETS_KM = {95001: 0.0, 95002: 5.0, 95003: 10.0, 95004: 20.0, 95005: 40.0}
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * nearby.EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+@pytest.fixture
+def index():
+    lat, lon = ORIGIN
+    degrees_per_km = 1 / (nearby.EARTH_RADIUS_KM * math.radians(1) * math.cos(math.radians(lat)))
+    # Listed out of order so ranking can't come from row order
+    zips = [95004, 95001, 95005, 95003, 95002]
+    centroids = pd.DataFrame({
+        "ZIP Code": zips,
+        "Latitude": [lat] * len(zips),
+        "Longitude": [lon + OFFSETS_KM[z] * degrees_per_km for z in zips],
+    })
+    df = pd.DataFrame({
+        "City": ["Testville"] * len(zips),
+        "ZIP Code": zips,
+        "Water Quality Score": [90, 60, 95, 70, 80],
+        "Meets EPA Standards": ["Yes", "No", "Yes", "No", "No"],
+    })
+    return nearby.NearbyIndex(df, centroids)
+
+
+def test_nearest_is_ordered_by_haversine_distance(index):
+    found = index.nearest(*ORIGIN, k=5)
+    assert [r["zip_code"] for r in found] == [95001, 95002, 95003, 95004, 95005]
+    for record in found:
+        expected = haversine_km(*ORIGIN, *index.centroid(record["zip_code"]))
+        assert record["distance_km"] == pytest.approx(expected, abs=0.01)
+
+
+def test_exclusion(index):
+    assert [r["zip_code"] for r in index.nearest(*ORIGIN, k=2, exclude=95001)] == [95002, 95003]
+    assert len(index.nearest(*ORIGIN, k=1000, exclude=95001)) == 4
+    # A ZIP that isn't in the index doesn't cost a row
+    assert len(index.nearest(*ORIGIN, k=1000, exclude=99999)) == 5
+
+
+def test_radius_cutoff(index):
+    comparison = index.compare(95001, *ORIGIN, radius_km=15.0)
+    # 95004 (20 km) meets EPA but is outside the radius
+    assert comparison["nearest_meeting_epa"] is None
+    assert comparison["nearest_higher_score"]["zip_code"] == 95002
+    wide = index.compare(95001, *ORIGIN, radius_km=25.0)
+    assert wide["nearest_meeting_epa"]["zip_code"] == 95004
+    assert 95001 not in [r["zip_code"] for r in wide["nearest"]]
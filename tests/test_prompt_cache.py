@@ -0,0 +1,88 @@
+import pytest
+
+from aquaed import prompt_cache
+from aquaed.prompt_cache import NearDuplicateCache, canonical_city
+
+ISSUE = "my tap water tastes like metal and smells odd in the morning"
+
+
+def test_thresholds():
+    # The cases below sit close to these; retune them together
+    assert prompt_cache.CITY_MATCH_CUTOFF == 0.92
+    assert NearDuplicateCache().threshold == 0.8
+
+
+@pytest.mark.parametrize("text, city", [
+    ("San Jose", "San Jose"),
+    ("  san jose ", "San Jose"),
+    ("San José", "San Jose"),
+    ("San José, CA", "San Jose"),
+    ("san francisco california", "San Francisco"),
+    ("San Jos", "San Jose"),
+    ("Santa Clara", "Santa Clara"),
+    ("Santa Clarita", None),
+    ("Sacramento", None),
+    ("CA", None),
+    ("", None),
+])
+def test_canonical_city(text, city):
+    assert canonical_city(text) == city
+
+
+def test_near_duplicate_hit_and_miss():
+    cache = NearDuplicateCache()
+    cache.put("94101", ISSUE, "answer")
+    assert cache.get("94101", ISSUE.upper() + "!") == "answer"
+    # Estimated similarity ~0.86: a hit at the default threshold
+    assert cache.get("94101", "My water tastes like metal and smells odd in the morning") == "answer"
+    # ~0.77: close, but below it
+    assert cache.get("94101", "my tap water tastes like metal and smells odd each morning") is None
+    assert cache.get("94101", "the water pressure drops whenever a neighbour waters the lawn") is None
+    # The exact key must match too
+    assert cache.get("94102", ISSUE) is None
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 3}
+
+
+def test_threshold_is_configurable():
+    similar = "my tap water tastes like metal and smells odd each morning"
+    loose = NearDuplicateCache(threshold=0.7)
+    strict = NearDuplicateCache(threshold=1.0)
+    for cache in (loose, strict):
+        cache.put("94101", ISSUE, "answer")
+    assert loose.get("94101", similar) == "answer"
+    assert strict.get("94101", similar) is None
+
+
+def test_ttl(monkeypatch):
+    cache = NearDuplicateCache(ttl=60)
+    now = 1_000_000.0
+    monkeypatch.setattr(prompt_cache.time, "time", lambda: now)
+    cache.put("94101", ISSUE, "answer")
+    now += 59
+    assert cache.get("94101", ISSUE) == "answer"
+    now += 2
+    assert cache.get("94101", ISSUE) is None
+    assert cache.get("94101", ISSUE + " today") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidate():
+    cache = NearDuplicateCache()
+    cache.put("94101", ISSUE, "a")
+    cache.put("94102", ISSUE, "b")
+    assert cache.invalidate(lambda key: key == "94101") == 1
+    assert cache.get("94101", ISSUE) is None
+    assert cache.get("94102", ISSUE) == "b"
+
+
+def test_lru_bound():
+    cache = NearDuplicateCache(max_entries=2)
+    cache.put("k", "first question about lead pipes", 1)
+    cache.put("k", "second question about chlorine taste", 2)
+    # Reading the first entry makes the second the least recently used
+    assert cache.get("k", "first question about lead pipes") == 1
+    cache.put("k", "third question about hard water scale", 3)
+    assert cache.stats()["entries"] == 2
+    assert cache.get("k", "second question about chlorine taste") is None
+    assert cache.get("k", "first question about lead pipes") == 1
+    assert cache.get("k", "third question about hard water scale") == 3
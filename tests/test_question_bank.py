@@ -0,0 +1,60 @@
+import random
+import sqlite3
+from collections import Counter
+
+import pytest
+
+from aquaed.question_bank import QuestionBank, build
+
+
+def question(text, topic, difficulty="medium", language="English"):
+    return {"question": text, "options": ["a", "b"], "answer": "a", "topic": topic, "difficulty": difficulty, "language": language}
+
+
+@pytest.fixture
+def bank():
+    questions = (
+        [question(f"lead {i}", "lead", "easy" if i < 3 else "hard") for i in range(6)]
+        + [question(f"pfas {i}", "pfas") for i in range(2)]
+        + [question("general 0", "general")]
+        + [question("plomo 0", "lead", language="Spanish")]
+    )
+    conn = sqlite3.connect(":memory:")
+    build(conn, questions)
+    return QuestionBank(conn)
+
+
+def test_round_robin_across_topics(bank):
+    for seed in range(20):
+        sample = bank.sample(3, rng=random.Random(seed))
+        assert Counter(q["topic"] for q in sample) == {"lead": 1, "pfas": 1, "general": 1}
+    # Once a topic runs dry the others keep filling
+    sample = bank.sample(6, rng=random.Random(0))
+    assert Counter(q["topic"] for q in sample) == {"lead": 3, "pfas": 2, "general": 1}
+
+
+def test_distinct_ids(bank):
+    for seed in range(20):
+        ids = [q["id"] for q in bank.sample(8, rng=random.Random(seed))]
+        assert len(ids) == len(set(ids)) == 8
+
+
+def test_k_larger_than_bank(bank):
+    sample = bank.sample(50, rng=random.Random(0))
+    assert sorted(q["question"] for q in sample) == sorted(
+        [f"lead {i}" for i in range(6)] + ["pfas 0", "pfas 1", "general 0"]
+    )
+
+
+def test_filters(bank):
+    sample = bank.sample(10, topics={"lead"}, difficulty="hard", rng=random.Random(0))
+    assert sorted(q["question"] for q in sample) == ["lead 3", "lead 4", "lead 5"]
+
+
+def test_language_and_english_fallback(bank):
+    assert [q["question"] for q in bank.sample(5, language="Spanish")] == ["plomo 0"]
+    # Spanish has no pfas questions; French has none at all
+    assert {q["language"] for q in bank.sample(2, language="Spanish", topics={"pfas"})} == {"English"}
+    sample = bank.sample(3, language="French", rng=random.Random(0))
+    assert len(sample) == 3
+    assert {q["language"] for q in sample} == {"English"}
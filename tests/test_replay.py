@@ -0,0 +1,89 @@
+import json
+
+import httpx
+import pytest
+
+from aquaed import replay
+
+
+@pytest.fixture
+def recording(tmp_path, monkeypatch):
+    path = tmp_path / "trace.jsonl"
+    monkeypatch.setattr(replay, "MODE", "record")
+    monkeypatch.setattr(replay, "TRACE_PATH", str(path))
+    return path
+
+
+def chat_request(messages):
+    return httpx.Request(
+        "POST", "https://api.openai.com/v1/chat/completions",
+        content=json.dumps({"model": "gpt-4o-mini", "messages": messages}).encode(),
+    )
+
+
+def test_cached_completion_replays_for_the_same_request(recording):
+    messages = [{"role": "system", "content": "sys"}, {"role": "user", "content": "Mail me at a@b.com"}]
+    replay.record_cached_completion(messages, "Did you know?")
+    recordings = replay.Recordings(replay.read_trace(recording))
+
+    request = chat_request(messages)
+    found = recordings.take(replay.openai_key(request.method, request.url.path, json.loads(request.content)))
+    assert found is not None
+    response = replay._decode_response(found[0], request)
+    assert response.json()["choices"][0]["message"]["content"] == "Did you know?"
+
+
+def test_cache_hits_charged_median_upstream_latency(recording):
+    for latency in (1.0, 2.0, 3.0):
+        replay.write_event({
+            "type": "upstream", "kind": "openai", "key": f"k{latency}", "latency": latency,
+            "request": {"method": "POST", "path": "/v1/chat/completions", "body": {}}, "response": {},
+        })
+    replay.record_cached_completion([{"role": "user", "content": "hi"}], "hello")
+    replay.record_cached_geocode(37.33, -121.89, "95112")
+    recordings = replay.Recordings(replay.read_trace(recording))
+
+    chat_key = replay.openai_key("POST", "/chat/completions", {"messages": [{"role": "user", "content": "hi"}]})
+    assert recordings.take(chat_key)[1] == 2.0
+    # No recorded geocode went upstream, so there's nothing to charge
+    response, latency = recordings.take(replay.geocode_key(37.33, -121.89))
+    assert latency == 0.0
+    assert response["json"]["results"][0]["address_components"][0]["short_name"] == "95112"
+
+
+def test_cached_clip_stitches_back_to_the_same_audio(recording):
+    replay.record_cached_speech(["One.", "Two."], "nova", b"mp3")
+    recordings = replay.Recordings(replay.read_trace(recording))
+    parts = []
+    for chunk in ("One.", "Two."):
+        request = httpx.Request("POST", "https://api.openai.com/v1/audio/speech")
+        response, _ = recordings.take(replay.openai_key("POST", request.url.path, {"input": chunk, "voice": "nova"}))
+        parts.append(replay._decode_response(response, request).content)
+    assert b"".join(parts) == b"mp3"
+
+
+def test_nothing_recorded_when_off(tmp_path, monkeypatch):
+    monkeypatch.setattr(replay, "MODE", "off")
+    monkeypatch.setattr(replay, "TRACE_PATH", str(tmp_path / "trace.jsonl"))
+    replay.record_cached_completion([{"role": "user", "content": "hi"}], "hello")
+    assert not (tmp_path / "trace.jsonl").exists()
+
+
+def test_trace_is_private_and_in_data_dir(tmp_path, monkeypatch):
+    from aquaed import core
+    monkeypatch.setattr(core, "DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(replay, "TRACE_PATH", None)
+    monkeypatch.setattr(replay, "MODE", "record")
+    replay.record_cached_geocode(37.33, -121.89, "95112")
+    path = tmp_path / "data" / "aquaed-trace.jsonl"
+    assert path.stat().st_mode & 0o777 == 0o600
+    assert len(replay.read_trace(path)) == 1
+
+
+def test_trace_is_never_written_through_a_symlink(recording, tmp_path):
+    target = tmp_path / "elsewhere"
+    target.write_text("")
+    recording.symlink_to(target)
+    with pytest.raises(OSError):
+        replay.record_cached_geocode(37.33, -121.89, "95112")
+    assert target.read_text() == ""
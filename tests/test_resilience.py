@@ -0,0 +1,84 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from aquaed import resilience
+
+
+@pytest.fixture(autouse=True)
+def fresh_breaker(monkeypatch):
+    breaker = resilience.CircuitBreaker(min_calls=1)
+    monkeypatch.setattr(resilience, "breaker", breaker)
+    return breaker
+
+
+def status_error(cls, status):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    return cls("boom", response=httpx.Response(status, request=request), body=None)
+
+
+@pytest.mark.parametrize("error, transient", [
+    (TimeoutError(), True),
+    (ConnectionError(), True),
+    (openai.APITimeoutError(httpx.Request("POST", "https://api.openai.com")), True),
+    (status_error(openai.RateLimitError, 429), True),
+    (status_error(openai.InternalServerError, 503), True),
+    (status_error(openai.AuthenticationError, 401), False),
+    (status_error(openai.BadRequestError, 400), False),
+    (ValueError(), False),
+])
+def test_is_transient(error, transient):
+    assert resilience.is_transient(error) is transient
+
+
+def test_bad_key_is_not_hedged_or_replaced(fresh_breaker):
+    calls = []
+
+    def call(model):
+        calls.append(model)
+        raise status_error(openai.AuthenticationError, 401)
+
+    with pytest.raises(openai.AuthenticationError):
+        resilience.guarded(call, "gpt-4o", fallback=lambda: resilience.FallbackText("stand-in"))
+    assert calls == ["gpt-4o"]
+    assert fresh_breaker.state == "closed"
+
+
+def test_outage_is_hedged_then_falls_back(fresh_breaker):
+    calls = []
+
+    def call(model):
+        calls.append(model)
+        raise status_error(openai.InternalServerError, 500)
+
+    answer = resilience.guarded(call, "gpt-4o", fallback=lambda: resilience.FallbackText("stand-in"))
+    assert answer == "stand-in"
+    assert calls == ["gpt-4o", "gpt-4o-mini"]
+    assert fresh_breaker.state == "open"
+
+
+def test_empty_fallback_chains_upstream_error():
+    def call(model):
+        raise status_error(openai.InternalServerError, 500)
+
+    def fallback():
+        raise resilience.CircuitOpenError("unavailable")
+
+    with pytest.raises(resilience.CircuitOpenError) as info:
+        resilience.guarded(call, "gpt-4o", fallback=fallback)
+    assert isinstance(info.value.__cause__, openai.InternalServerError)
+
+
+def test_async_bad_request_is_raised(fresh_breaker):
+    calls = []
+
+    async def call(model):
+        calls.append(model)
+        raise status_error(openai.BadRequestError, 400)
+
+    with pytest.raises(openai.BadRequestError):
+        asyncio.run(resilience.aguarded(call, "gpt-4o", fallback=lambda: resilience.FallbackText("stand-in")))
+    assert calls == ["gpt-4o"]
+    assert fresh_breaker.state == "closed"
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from aquaed.routing import MIN_SAMPLES, Router
+
+CONFIG = {
+    "models": {
+        "cheap": {"input_price": 2.50, "output_price": 10.00},
+        "pricey": {"input_price": 30.00, "output_price": 60.00},
+    },
+    "sites": {
+        "recommendation": {"candidates": ["cheap", "pricey"], "slo_p95_ms": 1000},
+        "default": {"candidates": ["cheap"], "slo_p95_ms": 1000},
+    },
+}
+
+
+class NoExplore(random.Random):
+    def random(self):
+        return 1.0
+
+
+@pytest.fixture
+def router():
+    return Router(CONFIG, rng=NoExplore())
+
+
+def test_cold_start_picks_cheapest(router):
+    assert router.choose("recommendation") == "cheap"
+
+
+def test_one_sample_does_not_flip_to_unsampled_model(router):
+    router.record("recommendation", "cheap", 0.3, 400, 500)
+    assert router.cost_per_call("recommendation", "cheap") < router.cost_per_call("recommendation", "pricey")
+    assert [router.choose("recommendation") for _ in range(10)] == ["cheap"] * 10
+
+
+def test_candidates_priced_on_pooled_profile(router):
+    router.record("recommendation", "cheap", 0.3, 100, 100)
+    router.record("recommendation", "pricey", 0.3, 300, 300)
+    # Both priced on the pooled mean of 200 prompt and 200 completion tokens
+    assert router.cost_per_call("recommendation", "cheap") == pytest.approx(200 * (2.5 + 10) / 1_000_000)
+    assert router.cost_per_call("recommendation", "pricey") == pytest.approx(200 * (30 + 60) / 1_000_000)
+
+
+def test_slo_miss_routes_to_next_cheapest(router):
+    for _ in range(MIN_SAMPLES):
+        router.record("recommendation", "cheap", 2.0, 400, 500)
+    assert router.choose("recommendation") == "pricey"
+
+
+def test_nobody_meets_slo_takes_fastest(router):
+    for _ in range(MIN_SAMPLES):
+        router.record("recommendation", "cheap", 3.0)
+        router.record("recommendation", "pricey", 2.0)
+    assert router.choose("recommendation") == "pricey"
+
+
+def test_unknown_site_uses_default(router):
+    assert router.choose("unknown") == "cheap"
+
+
+def test_exploration_picks_any_candidate():
+    class AlwaysExplore(random.Random):
+        def random(self):
+            return 0.0
+
+        def choice(self, seq):
+            return seq[-1]
+
+    assert Router(CONFIG, rng=AlwaysExplore()).choose("recommendation") == "pricey"
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from aquaed import sessions
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    path = tmp_path / "sessions"
+    monkeypatch.setattr(sessions, "ARTIFACT_ROOT", str(path))
+    return path
+
+
+def test_artifacts_are_private(root):
+    path = sessions.new_artifact(".pdf", session_id="s1")
+    assert os.path.dirname(path) == str(root / "s1")
+    for directory in (root, root / "s1"):
+        assert os.stat(directory).st_mode & 0o777 == 0o700
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+
+def test_root_owned_by_another_user_is_refused(root, monkeypatch):
+    root.mkdir()
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(root).st_uid + 1)
+    with pytest.raises(PermissionError):
+        sessions.new_artifact(".pdf", session_id="s1")
+
+
+def test_ended_session_is_reclaimed(root):
+    path = sessions.new_artifact(".pdf", session_id="s1")
+    assert sessions.sweep(now=1e12, live_ids=set()) == ["s1"]
+    assert not os.path.exists(path)
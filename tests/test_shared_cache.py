@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+from aquaed import core, shared_cache
+
+
+def test_default_cache_lives_in_private_data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "DATA_DIR", str(tmp_path / "data"))
+    url = shared_cache.default_url()
+    assert url == "sqlite:///" + str(tmp_path / "data" / "aquaed-cache.sqlite")
+    assert os.stat(tmp_path / "data").st_mode & 0o777 == 0o700
+
+
+def test_cache_file_owned_by_another_user_is_refused(tmp_path, monkeypatch):
+    path = tmp_path / "cache.sqlite"
+    path.write_bytes(b"")
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(path).st_uid + 1)
+    with pytest.raises(PermissionError):
+        shared_cache.SQLiteCache(str(path))
+
+
+def test_round_trip(tmp_path):
+    cache = shared_cache.SQLiteCache(str(tmp_path / "cache.sqlite"))
+    cache.set("llm", "k", b"answer")
+    assert cache.get("llm", "k") == b"answer"
+    assert cache.get("llm", "missing") is None
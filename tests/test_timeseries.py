@@ -0,0 +1,36 @@
+import subprocess
+import sys
+
+import pandas as pd
+
+from aquaed import timeseries
+
+
+def test_import_does_not_load_pyarrow():
+    code = "import sys, aquaed.timeseries; sys.exit('pyarrow' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
+
+
+def test_ingest_then_trend(tmp_path):
+    raw = pd.DataFrame({
+        "ZIP": [95112, 95112, 95112],
+        "County": ["Santa Clara"] * 3,
+        "Date": ["2023-01-05", "2023-01-20", "2023-02-01"],
+        "Contaminant": ["Nitrate"] * 3,
+        "Value": [1.0, 3.0, 5.0],
+    })
+    assert timeseries.ingest(raw, root=str(tmp_path)) == ["Santa Clara"]
+    rows = timeseries.trend(95112, "Nitrate", "month", root=str(tmp_path))
+    assert rows["mean"].tolist() == [2.0, 5.0]
+    assert rows["count"].tolist() == [2, 1]
+
+
+def test_cli_root_after_subcommand(tmp_path, capsys):
+    csv = tmp_path / "samples.csv"
+    pd.DataFrame({
+        "ZIP": [95112], "County": ["Santa Clara"], "Date": ["2023-01-05"], "Contaminant": ["Nitrate"], "Value": [1.0],
+    }).to_csv(csv, index=False)
+    root = tmp_path / "store"
+    timeseries.main(["ingest", str(csv), "--root", str(root)])
+    timeseries.main(["trend", "95112", "--root", str(root)])
+    assert "Nitrate" in capsys.readouterr().out
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from aquaed import core, tts
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    monkeypatch.setattr(tts, "cached_clip", lambda text, voice=tts.DEFAULT_VOICE: None)
+    monkeypatch.setattr(tts, "store_clip", lambda key, clip: None)
+
+
+TEXT = " ".join(f"Sentence number {i} is here." for i in range(200))
+
+
+def test_stream_speech_limits_requests_in_flight(monkeypatch):
+    lock = threading.Lock()
+    state = {"now": 0, "peak": 0}
+
+    def synthesize(text, voice="nova"):
+        with lock:
+            state["now"] += 1
+            state["peak"] = max(state["peak"], state["now"])
+        time.sleep(0.01)
+        with lock:
+            state["now"] -= 1
+        return text.encode()
+
+    monkeypatch.setattr(core, "synthesize_speech", synthesize)
+    clip = b"".join(tts.stream_speech(TEXT))
+    assert clip == "".join(tts.split_text(TEXT)).encode()
+    assert len(tts.split_text(TEXT)) > tts.MAX_IN_FLIGHT
+    assert state["peak"] <= tts.MAX_IN_FLIGHT
+
+
+def test_astream_speech_limits_requests_in_flight(monkeypatch):
+    state = {"now": 0, "peak": 0}
+
+    async def synthesize(text, voice="nova"):
+        state["now"] += 1
+        state["peak"] = max(state["peak"], state["now"])
+        await asyncio.sleep(0.01)
+        state["now"] -= 1
+        return text.encode()
+
+    async def collect():
+        return b"".join([part async for part in tts.astream_speech(TEXT)])
+
+    monkeypatch.setattr(core, "asynthesize_speech", synthesize)
+    assert asyncio.run(collect()) == "".join(tts.split_text(TEXT)).encode()
+    assert state["peak"] == tts.MAX_IN_FLIGHT
+
+
+def test_split_text_keeps_sentences_together():
+    assert tts.split_text("One. Two! Three?\nFour", first_chunk_chars=9, chunk_chars=12) == ["One. Two!", "Three? Four"]
+
+
+def test_split_text_hard_splits_runs_without_sentence_ends():
+    text = " ".join(["word"] * 2000) + " " + "x" * 1500
+    chunks = tts.split_text(text)
+    assert max(len(chunk) for chunk in chunks) <= tts.CHUNK_CHARS
+    assert "".join(chunks).replace(" ", "") == text.replace(" ", "")
@@ -0,0 +1,91 @@
+import shutil
+
+import pandas as pd
+import pytest
+
+from aquaed import core, water_data
+
+
+@pytest.fixture
+def data_file(tmp_path, monkeypatch):
+    path = tmp_path / "bayareawater.csv"
+    shutil.copy(core.WATER_DATA_PATH, path)
+    monkeypatch.setattr(core, "WATER_DATA_PATH", str(path))
+    monkeypatch.setattr(core, "DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(water_data, "POLL_INTERVAL", 0)
+    monkeypatch.setattr(water_data, "_snapshot", None)
+    monkeypatch.setattr(water_data, "_history", water_data.deque(maxlen=water_data.HISTORY))
+    return path
+
+
+def original():
+    return pd.read_csv(core.WATER_DATA_PATH)
+
+
+def test_validate_accepts_the_shipped_data():
+    water_data.validate(original())
+
+
+def test_validate_reports_every_problem():
+    df = original()
+    df.loc[0, "ZIP Code"] = 10001
+    df.loc[1, "Water Quality Score"] = 150
+    df.loc[2, "Meets EPA Standards"] = "Maybe"
+    with pytest.raises(water_data.ValidationError) as info:
+        water_data.validate(df)
+    message = str(info.value)
+    assert "outside California" in message
+    assert "outside 0–100" in message
+    assert "Yes/No" in message
+
+
+def test_validate_missing_columns():
+    with pytest.raises(water_data.ValidationError, match="missing columns: City"):
+        water_data.validate(original().drop(columns="City"))
+
+
+def test_diff_zip_spanning_several_rows():
+    old = original()
+    assert set(old.loc[old["ZIP Code"] == 94540, "City"]) == {"Fremont", "Hayward"}
+    new = old.copy()
+    row = new.index[(new["ZIP Code"] == 94540) & (new["City"] == "Hayward")][0]
+    new.loc[row, "Water Quality Score"] += 1
+    # Row order alone is not a change
+    changes = water_data.diff(old, new.iloc[::-1])
+    assert changes.changed == {94540: ["Water Quality Score"]}
+    assert changes.cities == {"Fremont", "Hayward"}
+    assert not changes.added and not changes.removed
+
+
+def test_diff_added_and_removed():
+    old = original()
+    new = old[old["ZIP Code"] != 94101]
+    extra = old.iloc[[0]].assign(**{"ZIP Code": 96100})
+    changes = water_data.diff(old, pd.concat([new, extra]))
+    assert changes.removed == [94101]
+    assert changes.added == [96100]
+    assert changes.zips == {94101, 96100}
+
+
+def test_refresh_rejects_bad_file_and_keeps_current(data_file):
+    before = water_data.current()
+    df = original()
+    df.loc[0, "Water Quality Score"] = -5
+    df.to_csv(data_file, index=False)
+    assert water_data.refresh(force=True) is None
+    assert water_data.current() is not before
+    assert water_data.current().version == before.version
+    assert water_data.current().df is before.df
+    assert water_data.status()["history"][0]["status"] == "rejected"
+
+
+def test_refresh_swaps_in_a_valid_change(data_file):
+    before = water_data.current()
+    df = original()
+    df.loc[df["ZIP Code"] == 94101, "Water Quality Score"] = 50
+    df.to_csv(data_file, index=False)
+    changes = water_data.refresh(force=True)
+    assert changes.changed == {94101: ["Water Quality Score"]}
+    assert water_data.current().version != before.version
+    assert core.lookup_zip(94101)["score"] == 50
+    assert water_data.status()["history"][0]["status"] == "loaded"